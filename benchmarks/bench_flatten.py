@@ -0,0 +1,58 @@
+"""Compares :func:`budget.processing.flatten_mask_tree` against the previous approach of summarizing the subtree below
+every node, on a deep synthetic category tree
+
+Run with the package installed: ``python benchmarks/bench_flatten.py [depth] [rows]``
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from budget.processing import flatten_mask_tree, summarize
+
+
+def recursive_items(nested_dicts):
+    # previous version of budget.utils.recursive_items, which yielded every dict node twice
+    for key, value in nested_dicts.items():
+        yield (key, value)
+        if isinstance(value, dict):
+            yield (key, value)
+            yield from recursive_items(value)
+        elif isinstance(value, list) and any([isinstance(item, dict) for item in value]):
+            for item in value:
+                if isinstance(item, dict):
+                    yield from recursive_items(item)
+
+
+def gen_tree(depth: int, rows: int, branches: int = 2, prefix: str = 'cat') -> dict:
+    rng = np.random.default_rng(depth)
+    index = pd.date_range('2015-01-01', periods=rows, freq='h', name='Date')
+
+    def node(level, name):
+        if level == depth:
+            return [pd.Series(rng.random(rows) < 0.01, index=index) for _ in range(2)]
+        return {f'{name}.{i}': node(level + 1, f'{name}.{i}') for i in range(branches)}
+
+    return node(0, prefix)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    res = func(*args)
+    return res, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    tree = gen_tree(depth, rows)
+
+    new, t_new = timed(flatten_mask_tree, tree)
+    old, t_old = timed(lambda t: {key: summarize(value) for key, value in recursive_items(t)}, tree)
+
+    assert list(new) == list(old), 'keys are different'
+    assert all(new[key].equals(old[key]) for key in old), 'masks are different'
+    print(f'depth {depth}, {len(new)} nodes, {rows} rows')
+    print(f'summarize each node: {t_old:.2f}s')
+    print(f'bottom-up:           {t_new:.2f}s ({t_old / t_new:.1f}x)')
@@ -0,0 +1,41 @@
+"""Compares the row-wise :func:`budget.load.hash` against the batched :func:`budget.load.hash_df`
+
+Run with the package installed: ``python benchmarks/bench_hash.py [rows]``
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from budget.load import hash, hash_df
+
+
+def gen_df(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        data={
+            'Amount': rng.normal(0, 200, rows).round(2),
+            'Description': [f'Transaction #{i}' for i in rng.integers(0, rows // 10 + 1, rows)]
+        },
+        index=pd.Index(pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, rows), unit='D'), name='Date')
+    )
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    res = func(*args, **kwargs)
+    return res, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = gen_df(rows)
+
+    batch, t_batch = timed(hash_df, df)
+    row_wise, t_row = timed(df.apply, hash, axis=1)
+
+    assert (batch.values == row_wise.values).all(), 'hash_df does not match hash'
+    print(f'{rows} rows')
+    print(f'df.apply(hash, axis=1): {t_row:.2f}s')
+    print(f'hash_df(df):            {t_batch:.2f}s ({t_row / t_batch:.1f}x)')
@@ -0,0 +1,89 @@
+"""Compares the vectorized :meth:`budget.notes.manager.NoteManager.apply_notes` against applying the notes one at a
+time, which is how it used to work, with thousands of link and split notes
+
+Run with the package installed: ``python benchmarks/bench_notes.py [notes]``
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from budget.notes import Link, NoteManager, SplitNote
+
+CATEGORIES = ['Food', 'Bills', 'Big Cat', None]
+
+
+def apply_linked(nm: NoteManager, df: pd.DataFrame) -> pd.DataFrame:
+    # previous version of NoteManager.apply_linked
+    link_notes = nm.get_notes_by_type(Link)
+    source_in_df = link_notes.apply(lambda n: n.id in df['id'].values)
+    target_in_df = link_notes.apply(lambda n: n.target in df['id'].values)
+    df = df.reset_index().set_index('id')
+    for n in link_notes[source_in_df & target_in_df]:
+        df.loc[n.target, 'Amount'] += df.loc[n.id, 'Amount']
+    for n in link_notes[source_in_df]:
+        df.loc[n.id, 'Amount'] = 0
+    return df.reset_index().set_index(df.columns[0])
+
+
+def apply_split(nm: NoteManager, df: pd.DataFrame, cat: str) -> pd.DataFrame:
+    # previous version of NoteManager.apply_split
+    split_notes = nm.get_notes_by_type(SplitNote)
+    for_this_cat = split_notes.apply(lambda n: cat in n.parts)
+    trans_in_df = split_notes.apply(lambda n: n.id in df['id'].values)
+    df = df.reset_index().set_index('id')
+    for n in split_notes[trans_in_df & for_this_cat]:
+        orig_val = df.loc[n.id, 'Amount']
+        df.loc[n.id, 'Amount'] = n.parts[cat].modify(orig_val)
+    for n in split_notes[trans_in_df & ~for_this_cat]:
+        orig_val = df.loc[n.id, 'Amount']
+        for target_cat, split_obj in n.parts.items():
+            df.loc[n.id, 'Amount'] -= split_obj.modify(orig_val)
+    return df.reset_index().set_index(df.columns[0])
+
+
+def gen_data(n_notes: int):
+    rng = np.random.default_rng(0)
+    n = n_notes * 4
+    df = pd.DataFrame(
+        {'Amount': rng.integers(-50000, 50000, n) / 100, 'id': [f'{i:032x}' for i in range(n)]},
+        index=pd.Index(pd.date_range('2015-01-01', periods=n, freq='h'), name='Date')
+    )
+    ids = df['id'].values
+    texts = [
+        'split: 50% Food, 1/3 Bills', 'split: $12.50 Big Cat', 'split: 25%, 10% Food', 'split: 1/4 Bills'
+    ]
+    nm = NoteManager()
+    for i in range(n_notes):
+        if i % 2:
+            # a few sources link to several targets. Chains of links aren't included because they're now followed
+            # through to the end, which the old version didn't do
+            nm.add_note(ids[rng.integers(n // 2, n)], f'link: {ids[rng.integers(0, n // 2)]}', drop_dups=False)
+        else:
+            nm.add_note(ids[rng.integers(0, n)], texts[rng.integers(0, len(texts))], drop_dups=False)
+    nm.drop_duplicates()
+    return nm, df
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    res = func(*args)
+    return res, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    n_notes = int(sys.argv[1]) if len(sys.argv) > 1 else 12_000
+    nm, df = gen_data(n_notes)
+    print(f'{nm.table.shape[0]} notes, {df.shape[0]} transactions')
+
+    old, t_old = timed(apply_linked, nm, df)
+    new, t_new = timed(nm.apply_linked, df)
+    assert old['Amount'].equals(new['Amount']) and list(old.columns) == list(new.columns), 'links are different'
+    print(f'apply_linked: {t_old:.2f}s -> {t_new * 1000:.1f}ms')
+
+    for cat in CATEGORIES:
+        old, t_old = timed(apply_split, nm, df, cat)
+        new, t_new = timed(nm.apply_split, df, cat)
+        assert old['Amount'].equals(new['Amount']), f'splits are different for {cat}'
+        print(f'apply_split({cat!r}): {t_old:.2f}s -> {t_new * 1000:.1f}ms')
@@ -0,0 +1,43 @@
+"""Compares :meth:`pandas.Series.str.contains` against :class:`budget.search.TrigramIndex` on synthetic descriptions
+
+Run with the package installed: ``python benchmarks/bench_search.py [rows]``
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from budget.search import TrigramIndex
+
+WORDS = ['AMAZON', 'Mktp', 'STARBUCKS', 'Shell', 'Oil', 'PIZZA', 'hut', 'Uber', 'Trip', 'Netflix', 'Spotify',
+         'Kroger', 'HEB', 'Costco', 'Whole', 'Foods', 'Target', 'Walmart', 'PAYPAL', 'Venmo']
+QUERIES = ['pizza', 'starbucks|shell oil', 'amaz.*prime', '(?=uber)(?=.*trip)', 'Whole Foods #12', r'\d+']
+
+
+def gen_descriptions(rows: int, distinct: int) -> pd.Series:
+    rng = np.random.default_rng(0)
+    uniques = np.array(
+        [' '.join(rng.choice(WORDS, 3)) + f' #{rng.integers(0, 99999)} TX' for _ in range(distinct)],
+        dtype=object
+    )
+    return pd.Series(uniques[rng.integers(0, distinct, rows)], name='Description')
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    res = func(*args, **kwargs)
+    return res, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    desc = gen_descriptions(rows, rows // 10)
+
+    index, t = timed(TrigramIndex, desc)
+    print(f'{rows} rows, index built in {t:.2f}s')
+    for query in QUERIES:
+        old, t_old = timed(desc.str.contains, query, case=False)
+        new, t_new = timed(index.search, query, case=False)
+        assert old.equals(new), f'results are different for {query}'
+        print(f'{query!r:25} str.contains: {t_old * 1000:6.0f}ms, index: {t_new * 1000:5.1f}ms')
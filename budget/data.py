@@ -1,20 +1,26 @@
+import json
 import logging
 import re
-import sqlite3
 import warnings
 from functools import reduce
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import yaml
 
-from .load import load_all_accounts, hash
+from .load import MANIFEST_COLUMNS, account_files, changed_files, file_signature, hash_df, load_config, load_files, \
+    update_manifest
 from .notes.manager import NoteManager
-from .notes.note import Note
-from .processing import gen_mask_tree, flatten_mask_tree
-from .utils import report
+from .notes.note import Link
+from .processing import last_match, leaf_patterns, leaf_queries, match_queries, update_matches
+from .rollup import KEYS as ROLLUP_KEYS, SQL_UNITS, add, by_category, code_totals, empty_cube, negate, nonzero, pivot, \
+    to_units
+from .search import TrigramIndex
+from .selections import SelectionMatrix
+from .sql import connect, create_table, date_filter, fingerprints, fold_log, insert_rows, key_column, sql_records, \
+    table_columns, temp_ids, track_changes, write_table
+from .utils import date_bounds, report, row_positions
 
 LOGGER = logging.getLogger(__name__)
 
@@ -40,13 +46,46 @@ class BudgetData:
     SQL_DF_TABLE : str
         name for the transaction table in the SQL database
     SQL_SEL_TABLE : str
-        name for the selections table in the SQL database
+        name for the selections table in the SQL database, which has the pattern code of each transaction
+    SQL_PATTERN_TABLE : str
+        name for the table of which categories are included in each selection pattern
+    SQL_QUERY_TABLE : str
+        name for the table of the leaf queries that the selections in the SQL database were matched against
+    SQL_MANIFEST_TABLE : str
+        name for the table of ingested CSV files in the SQL database
+    SQL_ROLLUP_TABLE : str
+        name for the rollup cube in the SQL database, with the total of each category on each date after the notes are
+        applied
+    SQL_ROLLUP_NOTES_TABLE : str
+        name for the table of the adjustments that the notes made to the rollup cube
+    SQL_ROLLUP_LOG_TABLE : str
+        name for the table of the dates of the transactions and selections that changed since the rollup cube was last
+        brought up to date
+    SQL_KEYS : dict
+        primary key column of each of the tables that :meth:`save_sql` only writes the changed rows of
+    SQL_INDEXES : dict
+        other columns to index in each of those tables
     DF_DATE_COL : str
         name for the date column in the SQL database
+    COLUMNAR_CACHE : bool
+        whether to keep a memory-mappable Arrow copy of the transactions and selections next to the SQL database,
+        which :meth:`load_sql` reads instead when it's up to date. Requires :mod:`pyarrow`
+    ROLLUP : bool
+        whether :meth:`report` totals the categories from a cube of the totals by date and category instead of
+        rendering all of their transactions. Reports straight from SQL use a cube that's saved in the database and
+        brought up to date with the changes since it was last used, see :meth:`refresh_rollup`
     """
     SQL_DF_TABLE = 'transactions'
     SQL_SEL_TABLE = 'selections'
+    SQL_PATTERN_TABLE = 'selection_patterns'
+    SQL_QUERY_TABLE = 'selection_queries'
+    SQL_MANIFEST_TABLE = 'manifest'
+    SQL_ROLLUP_TABLE = 'rollup'
+    SQL_ROLLUP_NOTES_TABLE = 'rollup_notes'
+    SQL_ROLLUP_LOG_TABLE = 'rollup_log'
     DF_DATE_COL = 'Date'
+    SQL_KEYS = {SQL_DF_TABLE: 'id', SQL_SEL_TABLE: 'id', SQL_PATTERN_TABLE: 'code'}
+    SQL_INDEXES = {SQL_DF_TABLE: [DF_DATE_COL], SQL_SEL_TABLE: [DF_DATE_COL, 'code']}
 
     def __init__(self, yaml_path: str):
         """
@@ -65,6 +104,12 @@ class BudgetData:
 
         self.RENDER_DROP_ID_COL = True
         self.RENDER_SORT = True
+        self.COLUMNAR_CACHE = True
+        self.SEARCH_INDEX = True
+        self.ROLLUP = True
+        self._saved = {}
+        self._window = None
+        self._sel_queries = None
 
     def __eq__(self, other):
         if isinstance(other, str):
@@ -91,6 +136,15 @@ class BudgetData:
         return self.amounts <= other
 
     def __getitem__(self, input):
+        # Categories can be selected straight from the database when the transactions haven't been loaded
+        if isinstance(input, str) and not hasattr(self, '_df'):
+            return self.query_category(input)
+
+        # Slices that reach outside of a partial load page in the rest of the dates first
+        bounds = date_bounds(input)
+        if bounds is not None:
+            self.load_history(*bounds)
+
         # Try to slice the transactions using the input
         # Allows slicing with date strings and boolean masks
         try:
@@ -118,17 +172,74 @@ class BudgetData:
 
         raise TypeError(f'Invalid selection: {type(input)}: {input}')
 
+    @property
+    def _df(self) -> pd.DataFrame:
+        """Transactions, indexed by date. Assigning a new :class:`~pandas.DataFrame` clears anything derived from the
+        old one, see :meth:`clear_df_cache`
+        """
+        return self._transactions
+
+    @_df.setter
+    def _df(self, df: pd.DataFrame):
+        self._transactions = df
+        self.clear_df_cache()
+
+    def clear_df_cache(self):
+        """Drops everything derived from :attr:`_df`. Needs to be called after modifying :attr:`_df` in place
+        """
+        for attr in ('_id_index', '_df_view', '_search_index', '_rollup', '_note_rollup'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+    def id_positions(self, ids) -> np.ndarray:
+        """Finds the row positions of transactions in :attr:`_df` by id
+
+        Parameters
+        ----------
+        ids : iterable of str
+            transaction ids to look up
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+            :class:`int` row position for each id, ``-1`` for ids that aren't in the transactions
+        """
+        if not hasattr(self, '_id_index'):
+            # the index is built once after the transactions change, keeping the first position of any repeated id.
+            # the extra -1 at the end of the positions is what get_indexer's -1 for a missing id ends up selecting
+            first = ~self._df['id'].duplicated().values
+            self._id_index = (pd.Index(self._df['id'].values[first]), np.append(np.flatnonzero(first), -1))
+
+        index, rows = self._id_index
+        return rows[index.get_indexer(pd.Index(ids, dtype=object))]
+
+    @property
+    def _sel(self) -> SelectionMatrix:
+        """Category selections for each transaction, stored compactly as a
+        :class:`~budget.selections.SelectionMatrix`. Boolean :class:`~pandas.DataFrame` objects are converted when
+        they're assigned
+        """
+        return self._selections
+
+    @_sel.setter
+    def _sel(self, sel):
+        if isinstance(sel, pd.DataFrame):
+            sel = SelectionMatrix.from_frame(sel)
+        self._selections = sel
+        for attr in ('_rollup', '_note_rollup'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+
     @property
     def cfg(self) -> Dict:
-        """Loads and returns the configuration `dict` from the yaml file used to create the :class:`budget.BudgetData`
-        instance
+        """Returns the configuration `dict` from the yaml file used to create the :class:`budget.BudgetData` instance.
+        The file is only parsed again when it changes, see :func:`~budget.load.load_config`
 
         Returns
         -------
         dict
         """
-        with self.yaml_path.open('r') as file:
-            return yaml.load(file, Loader=yaml.SafeLoader)
+        return load_config(self.yaml_path)
 
     @property
     def categories(self) -> Dict:
@@ -140,6 +251,17 @@ class BudgetData:
         """
         return self.cfg['Categories']
 
+    @property
+    def query_text(self) -> List[str]:
+        """Leaf queries of the categories in the yaml file as JSON text, which is how they're saved alongside the
+        selections. Selections only stay valid while the queries they were matched against stay the same
+
+        Returns
+        -------
+        list of str
+        """
+        return [json.dumps(q) for q in leaf_queries(self.categories)]
+
     @property
     def exclude(self):
         try:
@@ -149,7 +271,9 @@ class BudgetData:
 
     @property
     def df(self) -> pd.DataFrame:
-        """
+        """Transactions without the ``id`` column and with the gaps filled in with ``''``.
+
+        The result is cached until :attr:`_df` changes, so it's shared between calls and shouldn't be modified
 
         Returns
         -------
@@ -157,10 +281,27 @@ class BudgetData:
         """
         if not hasattr(self, '_df'):
             self.load_sql()
+        if not hasattr(self, '_df_view'):
+            self._df_view = self.build_df_view()
+        return self._df_view
+
+    def build_df_view(self) -> pd.DataFrame:
+        """Builds the version of the transactions returned by :attr:`df`
+
+        Returns
+        -------
+        :pandas_api:`pandas.DataFrame`
+        """
         if 'id' in self._df.columns:
-            return self._df.drop('id', axis=1).fillna('')
+            df = self._df.drop('id', axis=1)
         else:
-            return self._df.fillna('')
+            df = self._df.copy()
+
+        # categorical columns need '' as a category before it can be used to fill in the gaps
+        for col in df.select_dtypes('category').columns:
+            if '' not in df[col].cat.categories:
+                df[col] = df[col].cat.add_categories('')
+        return df.fillna('')
 
     @property
     def id(self) -> pd.Series:
@@ -168,16 +309,8 @@ class BudgetData:
 
     @property
     def categorization(self):
-        def find_cat(row):
-            try:
-                if row.any():
-                    res = row.index[row][-1]
-                    return res
-            except:
-                raise
-
         if not hasattr(self, '_categorization'):
-            self._categorization = self._sel.apply(find_cat, axis=1)
+            self._categorization = last_match(self._sel)
         return self._categorization
 
     @property
@@ -187,16 +320,14 @@ class BudgetData:
 
     @property
     def unselected(self) -> pd.DataFrame:
-        return ~self._sel.any(axis=1) & ~self._df['id'].isin(self._notes.index)
+        return ~self._sel.any(axis=1) & ~self._df['id'].isin(self.note_manager.table['id'])
 
     @property
     def notes(self) -> pd.Series:
-        # return self.note_manager.notes.map(lambda n: n.note)
-        ids = self.note_manager.notes.index.to_series()
-        res = ids.apply(lambda v: self.find_by_id(v))
-        res['Note'] = self.note_manager.notes.apply(lambda n: n.note)
-        res = res.set_index('Date').drop('id', axis=1).sort_index(ascending=False)
-        return res
+        text = self.note_manager.note_text
+        res = self.df_from_ids(text.index)
+        res['Note'] = text.values
+        return res.drop('id', axis=1).sort_index(ascending=False)
 
     @property
     def _notes(self) -> pd.Series:
@@ -212,96 +343,692 @@ class BudgetData:
 
     def hash_transactions(self, df: pd.DataFrame = None) -> pd.DataFrame:
         if df is None:
-            df = self._df
-        df['id'] = df.apply(hash, axis=1)
-        return df
+            self._df['id'] = hash_df(self._df)
+            self.clear_df_cache()
+            return self._df
+        # other frames can be shared, like the cached df view, so they get hashed into a copy
+        return df.assign(id=hash_df(df))
 
-    def load_csv(self):
+    @property
+    def manifest(self) -> pd.DataFrame:
+        """The CSV files that have been ingested, with their ``path``, ``size``, ``mtime`` and content ``hash``. Read from
+        the SQL database the first time it's needed
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+        """
+        if not hasattr(self, '_manifest'):
+            if self.db_path is not None and self.db_path.exists():
+                with self.sql_context() as con:
+                    self._manifest = self.read_manifest(con)
+            else:
+                self._manifest = pd.DataFrame(columns=MANIFEST_COLUMNS)
+        return self._manifest
+
+    def load_csv(self, workers: int = None, executor: str = 'process', incremental: bool = False):
         """Loads transactions from all the accounts into a single :class:`~pandas.DataFrame`
 
+        Parameters
+        ----------
+        workers : int
+            number of CSV files to parse concurrently, see :func:`~budget.load.load_all_accounts`
+        executor : str
+            ``'process'`` or ``'thread'``
+        incremental : bool
+            only parse the files that are new or changed according to the :attr:`manifest`, and only add transactions
+            whose ids aren't already loaded
+
         Returns
         -------
 
         """
         LOGGER.debug(f'Loading CSV files from {self.yaml_path.name}')
-        self._df = load_all_accounts(
+        if incremental and hasattr(self, '_df'):
+            self.append_transactions(self.read_new_csv(workers, executor, known_ids=self._df['id']))
+        else:
+            self._manifest = pd.DataFrame(columns=MANIFEST_COLUMNS)
+            self._df = self.read_new_csv(workers, executor)
+            self._window = None
+            self.process_categories()
+        return self._df
+
+    def read_new_csv(self, workers: int = None, executor: str = 'process', known_ids=None) -> pd.DataFrame:
+        """Parses the CSV files that are new or changed according to the :attr:`manifest` and records them in it
+
+        Parameters
+        ----------
+        workers : int
+            number of CSV files to parse concurrently
+        executor : str
+            ``'process'`` or ``'thread'``
+        known_ids :
+            ids of transactions that have already been loaded, which will be left out of the result
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            transactions from the new or changed files, without categories
+        """
+        files = list(account_files(
             cfg=self.cfg['Loading']['Accounts'],
             base=Path(self.cfg['Loading']['base'])
-        )
-        self.process_categories()
-        return self._df
+        ))
+        files, signatures = changed_files(files, self.manifest)
+        LOGGER.debug(f'{len(files)} new or changed CSV files')
+
+        dfs = []
+        for file_info, df in load_files(files, workers, executor):
+            dfs.append(df)
+            signatures.append(file_signature(file_info[2]))
+        self._manifest = update_manifest(self.manifest, signatures)
+
+        if len(dfs) == 0:
+            return pd.DataFrame(
+                columns=['Amount', 'Description', 'id', 'Account'],
+                index=pd.DatetimeIndex([], name=self.DF_DATE_COL)
+            )
 
-    def process_categories(self):
-        """Processes the categories using :func:`~budget.processing.gen_mask_tree` and
-        :func:`~budget.utils.flatten_mask_tree`.
+        df = pd.concat(dfs).drop_duplicates('id').sort_index()
+        if known_ids is not None:
+            df = df[~df['id'].isin(known_ids).values]
+        return df
+
+    def categorize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Matches transactions against the categories in the yaml file using
+        :func:`~budget.processing.match_queries`
+
+        The first leaf that each transaction matched is cached by its id, so when the categories are edited only the
+        transactions that could be affected by the changed leaves are matched again, see
+        :func:`~budget.processing.update_matches`
 
-        This results in
+        Only the leaves are run through :func:`~budget.processing.flatten_mask_tree`, see
+        :func:`~budget.processing.leaf_patterns`, so each transaction is just stored as the code of the leaf it matched
 
+        Returns
+        -------
+        :class:`~budget.selections.SelectionMatrix`
+            :class:`bool` selections with one column per category
         """
-        LOGGER.debug(f'Processing selections as defined in {self.yaml_path.name}')
+        cats = self.categories
         # Warnings need to be filtered out because there's groups in the regex matching down in there
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            self._sel = pd.DataFrame(
-                flatten_mask_tree(
-                    gen_mask_tree(
-                        df=self.df,
-                        cats=self.categories
-                    )
-                )
-            )
+            codes = self.match_categories(df, leaf_queries(cats))
+        patterns = leaf_patterns(cats)
+        # the last pattern is for transactions that didn't match anything
+        codes = np.where(codes >= 0, codes, patterns.shape[0] - 1)
+        return SelectionMatrix(codes, patterns.to_numpy(), patterns.columns, df.index)
+
+    def match_categories(self, df: pd.DataFrame, queries: List) -> np.ndarray:
+        """Finds the first of the category queries that each transaction matches, reusing the cached results from the
+        last time the transactions were matched
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+            index of the first matching query for each transaction, ``-1`` where nothing matches
+        """
+        desc = df.filter(regex='(?i).*desc').iloc[:, 0].fillna('')
+        if 'id' not in df.columns:
+            return match_queries(desc, queries)
+
+        old_queries, cache = getattr(self, '_match_cache', ([], pd.Series(dtype=int)))
+        old_codes = cache.reindex(df['id'].values).fillna(-2).values
+        codes = update_matches(desc, queries, old_queries, old_codes)
+
+        res = pd.Series(codes, index=df['id'].values)
+        if queries == old_queries:
+            res = pd.concat([cache, res])
+        self._match_cache = (queries, res[~res.index.duplicated(keep='last')])
+        return codes
+
+    def append_transactions(self, df: pd.DataFrame, sel: pd.DataFrame = None):
+        """Adds transactions to the ones already loaded, keeping both the transactions and selections sorted by date.
+
+        Only the new transactions get categorized, unless the categories no longer match the loaded selections, in which
+        case everything is processed again with :meth:`process_categories`
+
+        Parameters
+        ----------
+        df : :class:`~pandas.DataFrame`
+            new transactions
+        sel : :class:`~budget.selections.SelectionMatrix`
+            selections for the new transactions, if they've already been categorized
+        """
+        if df.shape[0] == 0:
+            return
+
+        if sel is None:
+            sel = self.categorize(df)
+
+        if sel.columns.tolist() != self._sel.columns.tolist() or self._sel_queries != self.query_text:
+            LOGGER.debug('Categories have changed since the selections were processed')
+            self._df = pd.concat([self._df, df]).sort_index(kind='mergesort')
+            self.process_categories()
+            return
+
+        df = df.assign(Category=last_match(sel).values)
+        df = pd.concat([self._df, df])
+        sel = self._sel.append(sel)
+
+        # the same stable ordering for both keeps the selections lined up with the transactions
+        order = np.argsort(df.index.values, kind='mergesort')
+        self._df = df.iloc[order]
+        self._sel = sel.take(order)
+        if hasattr(self, '_categorization'):
+            del self._categorization
+
+    def process_categories(self):
+        """Processes the categories using :meth:`categorize`, which creates the selections, and uses them to set the
+        ``Category`` of each transaction
+        """
+        # selections are saved as codes into the patterns, which all the transactions in the database need to agree on
+        self.load_history()
+        LOGGER.debug(f'Processing selections as defined in {self.yaml_path.name}')
+        self._sel_queries = self.query_text
+        self._sel = self.categorize(self._df)
+        if hasattr(self, '_categorization'):
+            del self._categorization
         self._df['Category'] = self.categorization
+        self.clear_df_cache()
         LOGGER.debug('Done')
 
     def sql_context(self, path=None):
+        """Pooled connection to a SQL database, with the performance profile from :func:`~budget.sql.connect` applied.
+        Using it as a context manager commits or rolls back a transaction without closing the connection
+        """
         if path is None:
             path = self.db_path
 
         try:
-            connection = sqlite3.connect(path)
+            return connect(path)
         except:
             LOGGER.error(f'Problem opening SQL connection to {path}')
             raise
-        else:
-            LOGGER.debug(f'Opened SQL connection to\n{path.resolve()}')
-            return connection
+
+    def sql_frames(self, df: pd.DataFrame = None, sel: SelectionMatrix = None) -> Dict[str, pd.DataFrame]:
+        """Transactions, selections and selection patterns in the form they're saved to SQL, see :attr:`SQL_KEYS`
+
+        Parameters
+        ----------
+        df : :class:`~pandas.DataFrame`
+            transactions, :attr:`_df` by default
+        sel : :class:`~budget.selections.SelectionMatrix`
+            selections of the same transactions, :attr:`_sel` by default
+
+        Returns
+        -------
+        dict
+            :class:`~pandas.DataFrame` for each SQL table name
+        """
+        df = self._df if df is None else df
+        sel = self._sel if sel is None else sel
+        return {
+            self.SQL_DF_TABLE: df.reset_index(),
+            self.SQL_SEL_TABLE: sel.code_frame().assign(id=df['id'].values).reset_index(),
+            self.SQL_PATTERN_TABLE: sel.pattern_frame().reset_index()
+        }
+
+    def saved_state(self, con, path: Path, notes: bool) -> Dict:
+        """Records what's in a SQL database after it's been saved or loaded, so that :meth:`save_sql` can tell which
+        rows have changed since then. Tables without a primary key aren't recorded, so they get written in full
+
+        Returns
+        -------
+        dict
+            resolved `path` of the database, :func:`~budget.sql.fingerprints` of the rows of each table and whether the
+            `notes` in the :class:`~budget.notes.manager.NoteManager` came from the database
+        """
+        state = {'path': path.resolve(), 'notes': notes, 'queries': self._sel_queries}
+        for name, frame in self.sql_frames().items():
+            if key_column(con, name) == self.SQL_KEYS[name]:
+                state[name] = fingerprints(frame, self.SQL_KEYS[name])
+        return state
 
     def save_sql(self, path=None):
-        path = Path(path) if isinstance(path, str) else path
+        """Saves the transactions, selections, notes and manifest to a SQL database in a single transaction.
+
+        When the database is the one that was last saved or loaded, only the rows that were added, changed or removed
+        since then get written, so the time it takes depends on the size of the edits rather than the size of the
+        database. Changes are found by comparing the :func:`~budget.sql.fingerprints` of the rows. The columnar cache is
+        only written again if the transactions or selections changed.
+
+        Transaction ids are the primary key of the SQL tables, so a :class:`ValueError` is raised if any of them are
+        repeated
+
+        Parameters
+        ----------
+        path : str or :class:`~pathlib.Path`
+            path of the database, :attr:`db_path` by default
+        """
+        path = Path(path) if path is not None else self.db_path
+        if self._window is not None and not self.can_update(path):
+            # anything that isn't saved row by row would lose the transactions outside of the window
+            self.load_history()
+        saved = self._saved if self._saved.get('path') == path.resolve() else {}
+        cached = self.COLUMNAR_CACHE and self.cache_current(path)
+        state = {'path': path.resolve(), 'notes': True, 'queries': self._sel_queries}
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             with self.sql_context(path) as con:
-                self._df.to_sql(name=self.SQL_DF_TABLE, con=con, if_exists='replace')
-                self._sel.to_sql(name=self.SQL_SEL_TABLE, con=con, if_exists='replace')
-                self.note_manager.save_notes(con)
+                try:
+                    con.execute('begin')
+                    frames = self.sql_frames()
+                    for name, frame in frames.items():
+                        state[name] = write_table(
+                            con, name, frame, self.SQL_KEYS[name], saved.get(name), self.SQL_INDEXES.get(name, [])
+                        )
+                    if 'queries' not in saved or saved['queries'] != self._sel_queries:
+                        self.save_queries(con)
+                    self.note_manager.save_notes(con, incremental=saved.get('notes', False))
+                    if hasattr(self, '_manifest'):
+                        self.save_manifest(con)
+                    self.fold_rollup_log(con)
+                except Exception:
+                    # everything gets rolled back, so the next save can't rely on any of it
+                    self._saved = {}
+                    raise
+            # moves the changes out of the write-ahead log so that the database file is older than the cache
+            con.execute('pragma wal_checkpoint(PASSIVE)')
+        self._saved = state
+
+        # written after the SQL transaction has been committed so that the cache ends up newer than the database
+        if self.COLUMNAR_CACHE:
+            if cached and all(name in saved and saved[name].equals(state[name]) for name in frames):
+                # the cache already has the same rows, so it only needs to be marked as up to date
+                for cache_path in self.cache_paths(path).values():
+                    cache_path.touch()
+            else:
+                self.save_cache(path)
 
-    def load_sql(self, path=None, notes=True):
-        path = Path(path) if isinstance(path, str) else path
+    def can_update(self, path: Path) -> bool:
+        """Whether :meth:`save_sql` can save the transactions and selections to a database by only writing the rows
+        that changed, which is the case for the database they were last saved to or loaded from
+        """
+        if self._saved.get('path') != path.resolve():
+            return False
+        frames = self.sql_frames()
         with self.sql_context(path) as con:
-            kwargs = {
-                'con': con,
-                'index_col': self.DF_DATE_COL,
-                'parse_dates': self.DF_DATE_COL
-            }
-            self._df = pd.read_sql_query(sql=f'select * from {self.SQL_DF_TABLE}', **kwargs)
-            self._sel = pd.read_sql_query(sql=f'select * from {self.SQL_SEL_TABLE}', **kwargs) == 1
-            # the '== 1' is necessary because the DataFrame comes in as 0s and 1s instead of Booleans
+            return all(
+                name in self._saved and table_columns(con, name) == frames[name].columns.tolist()
+                for name in (self.SQL_DF_TABLE, self.SQL_SEL_TABLE)
+            )
+
+    def load_sql(self, path=None, notes=True, start=None, end=None):
+        """Loads the transactions, selections, notes and manifest from a SQL database
+
+        Giving a `start` and/or `end` date only loads the transactions in between, with the date filtering done in SQL.
+        The rest get paged in as they're needed, see :meth:`load_history`
+
+        Parameters
+        ----------
+        path : str or :class:`~pathlib.Path`
+            path of the database, :attr:`db_path` by default
+        notes : bool
+            whether to load the notes
+        start : str or datetime
+            earliest date to load
+        end : str or datetime
+            date to load up to, not including the date itself
+        """
+        path = Path(path) if path is not None else self.db_path
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        cached = self.COLUMNAR_CACHE and self.load_cache(path, start, end)
+        with self.sql_context(path) as con:
+            if not cached:
+                self._df, self._sel = self.read_sql_range(con, start, end)
+            if hasattr(self, '_categorization'):
+                del self._categorization
+            self._window = (start, end) if start is not None or end is not None else None
+            self._sel_queries = self.read_queries(con)
+            self._manifest = self.read_manifest(con)
 
             if notes:
                 self.note_manager.load_notes(con)
+            self._saved = self.saved_state(con, path, notes)
         LOGGER.debug(f'left sql connection context')
 
-    def update_sql(self):
+    def read_sql_range(self, con, start: pd.Timestamp = None, end: pd.Timestamp = None):
+        """Reads the transactions and selections between two dates from SQL
+
+        Parameters
+        ----------
+        con : :mod:`sqlite3` connection
+        start : :class:`~pandas.Timestamp`
+            earliest date to read, unbounded if ``None``
+        end : :class:`~pandas.Timestamp`
+            date to read up to, not including the date itself. Unbounded if ``None``
+
+        Returns
+        -------
+        tuple
+            :class:`~pandas.DataFrame` of the transactions sorted by date, and their
+            :class:`~budget.selections.SelectionMatrix`
+        """
+        where, params = date_filter(self.DF_DATE_COL, start, end)
+        # rows that were upserted after the table was created are at the end of it
+        df = pd.read_sql_query(
+            sql=f'select * from {self.SQL_DF_TABLE}{where} order by "{self.DF_DATE_COL}", rowid',
+            con=con,
+            params=params,
+            index_col=self.DF_DATE_COL,
+            parse_dates=self.DF_DATE_COL
+        )
+        sel = self.read_selections(con, df['id'], start, end)
+        if 'Category' in df.columns:
+            df['Category'] = pd.Categorical(df['Category'], categories=sel.columns)
+        LOGGER.debug(f'Read {df.shape[0]} transactions{where} {params}')
+        return df, sel
+
+    def load_history(self, start=None, end=None):
+        """Pages in the transactions between two dates that are outside of the window given to :meth:`load_sql`, from
+        the same database. Does nothing if all the transactions are loaded. With no dates, everything gets loaded
+
+        Parameters
+        ----------
+        start : str or datetime
+            earliest date that's needed
+        end : str or datetime
+            date that's needed up to, not including the date itself
+        """
+        if self._window is None:
+            return
+
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        lo, hi = self._window
+        ranges = []
+        if lo is not None and (start is None or start < lo):
+            ranges.append((start, lo))
+            lo = start
+        if hi is not None and (end is None or end > hi):
+            ranges.append((hi, end))
+            hi = end
+        if len(ranges) == 0:
+            return
+
+        path = self._saved['path']
+        with self.sql_context(path) as con:
+            parts = [self.read_sql_range(con, a, b) for a, b in ranges]
+        df = pd.concat([p[0] for p in parts])
+        sel = reduce(SelectionMatrix.append, [p[1] for p in parts])
+        # transactions saved since the window was loaded can already be in memory
+        new = ~df['id'].isin(self._df['id']).values
+        df, sel = df[new], sel[new]
+        LOGGER.debug(f'Paging in {df.shape[0]} transactions from {path.name}')
+
+        for name, frame in self.sql_frames(df, sel).items():
+            if name in self._saved and name != self.SQL_PATTERN_TABLE:
+                self._saved[name] = pd.concat([self._saved[name], fingerprints(frame, self.SQL_KEYS[name])])
+
+        sel = self._sel.append(sel)
+        df = pd.concat([self._df, df])
+        order = np.argsort(df.index.values, kind='mergesort')
+        self._df = df.iloc[order]
+        self._sel = sel.take(order)
+        if hasattr(self, '_categorization'):
+            del self._categorization
+        self._window = (lo, hi) if lo is not None or hi is not None else None
+
+    def save_selections(self, con, sel: SelectionMatrix, ids, if_exists: str = 'replace'):
+        """Saves the pattern code and id of each transaction to the selections table and replaces the table of patterns
+
+        Parameters
+        ----------
+        con : :mod:`sqlite3` connection
+        sel : :class:`~budget.selections.SelectionMatrix`
+        ids :
+            transaction ids in the same order as `sel`
+        if_exists : str
+            ``'replace'`` or ``'append'``, passed to :meth:`~pandas.DataFrame.to_sql` for the selections table
+        """
+        sel.code_frame().assign(id=ids).to_sql(name=self.SQL_SEL_TABLE, con=con, if_exists=if_exists)
+        create_table(con, self.SQL_PATTERN_TABLE, sel.pattern_frame().reset_index(), key='code')
+
+    def save_queries(self, con):
+        """Saves the leaf queries that the selections were matched against, or drops the saved ones if they aren't
+        known, see :attr:`query_text`
+        """
+        if self._sel_queries is None:
+            con.execute(f'drop table if exists "{self.SQL_QUERY_TABLE}"')
+        else:
+            queries = pd.DataFrame({'query': self._sel_queries}, dtype='object').rename_axis('code').reset_index()
+            create_table(con, self.SQL_QUERY_TABLE, queries, key='code')
+
+    def read_queries(self, con) -> Optional[List[str]]:
+        """Reads the leaf queries that the selections in a SQL database were matched against, ``None`` if they weren't
+        saved
+        """
+        if self.table_exists(con, self.SQL_QUERY_TABLE):
+            query = f'select query from {self.SQL_QUERY_TABLE} order by code'
+            return pd.read_sql_query(sql=query, con=con)['query'].tolist()
+
+    def read_pattern_frame(self, con) -> pd.DataFrame:
+        if self.table_exists(con, self.SQL_PATTERN_TABLE):
+            # comes in as 0s and 1s instead of Booleans
+            return pd.read_sql_query(sql=f'select * from {self.SQL_PATTERN_TABLE}', con=con, index_col='code').sort_index() == 1
+
+    def read_selections(self, con, ids: pd.Series = None, start: pd.Timestamp = None,
+                        end: pd.Timestamp = None) -> SelectionMatrix:
+        """Reads the selections from SQL
+
+        Parameters
+        ----------
+        con : :mod:`sqlite3` connection
+        ids : :class:`~pandas.Series`
+            ids of the transactions to line the selections up with. The two tables only share the order of the rows
+            that were written at the same time
+        start : :class:`~pandas.Timestamp`
+            earliest date to read
+        end : :class:`~pandas.Timestamp`
+            date to read up to, not including the date itself
+
+        Returns
+        -------
+        :class:`~budget.selections.SelectionMatrix`
+        """
+        where, params = date_filter(self.DF_DATE_COL, start, end)
+        sel = pd.read_sql_query(
+            sql=f'select * from {self.SQL_SEL_TABLE}{where}',
+            con=con,
+            params=params,
+            index_col=self.DF_DATE_COL,
+            parse_dates=self.DF_DATE_COL
+        )
+        patterns = self.read_pattern_frame(con)
+        if 'code' in sel.columns and patterns is not None:
+            if ids is not None and 'id' in sel.columns:
+                pos = row_positions(sel['id'], ids)
+                if (pos >= 0).all():
+                    sel = sel.iloc[pos]
+            return SelectionMatrix(sel['code'].values, patterns.to_numpy(), patterns.columns, sel.index)
+        else:
+            # databases saved before the selections were stored as codes have a column of 0s and 1s for each category
+            return SelectionMatrix.from_frame(sel == 1)
+
+    def cache_paths(self, path: Path = None) -> Dict[str, Path]:
+        """Paths of the Arrow IPC (feather) files that cache the transactions and selections of a SQL database
+
+        Returns
+        -------
+        dict
+            :class:`~pathlib.Path` for each SQL table name
+        """
+        path = path or self.db_path
+        tables = (self.SQL_DF_TABLE, self.SQL_SEL_TABLE, self.SQL_PATTERN_TABLE)
+        return {table: path.with_name(f'{path.stem}.{table}.feather') for table in tables}
+
+    def save_cache(self, path: Path = None):
+        """Writes the transactions and selections to the columnar cache files from :meth:`cache_paths`. Nothing gets
+        written while only a window of the transactions is loaded, since the cache has to have all of them
+        """
+        try:
+            import pyarrow as pa
+            from pyarrow import feather
+        except ImportError:
+            LOGGER.debug('pyarrow is not installed, skipping the columnar cache')
+            return
+        if self._window is not None:
+            LOGGER.debug('Only a window of the transactions is loaded, skipping the columnar cache')
+            return
+
+        paths = self.cache_paths(path)
+        # the window goes along with the transactions, so that a cache of only some of them is never loaded
+        df = pa.Table.from_pandas(self._df.reset_index(), preserve_index=False)
+        df = df.replace_schema_metadata({**df.schema.metadata, b'window': json.dumps(self._window).encode()})
+        feather.write_feather(df, paths[self.SQL_DF_TABLE])
+        feather.write_feather(self._sel.code_frame().reset_index(), paths[self.SQL_SEL_TABLE])
+        feather.write_feather(self._sel.pattern_frame().reset_index(drop=True), paths[self.SQL_PATTERN_TABLE])
+        LOGGER.debug(f'Saved columnar cache to {paths[self.SQL_DF_TABLE].parent}')
+
+    def cache_current(self, path: Path = None) -> bool:
+        """Whether all the columnar cache files exist, are newer than the SQL database and have all of its
+        transactions
+        """
+        path = path or self.db_path
+        paths = self.cache_paths(path)
+        try:
+            import pyarrow as pa
+            # changes that haven't been checkpointed yet are only in the write-ahead log
+            wal = path.with_name(f'{path.name}-wal')
+            db_mtime = max(path.stat().st_mtime, wal.stat().st_mtime if wal.exists() else 0)
+            if any(p.stat().st_mtime < db_mtime for p in paths.values()):
+                return False
+            with pa.memory_map(str(paths[self.SQL_DF_TABLE])) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+        except (ImportError, FileNotFoundError):
+            return False
+        # caches written before the window was saved with them could have been written from a window
+        return json.loads(metadata.get(b'window', b'"unknown"')) is None
+
+    def load_cache(self, path: Path = None, start: pd.Timestamp = None, end: pd.Timestamp = None) -> bool:
+        """Loads the transactions and selections from the columnar cache, as long as the cache files are newer than the SQL
+        database. The files are memory-mapped and come back with their types intact, so no date or boolean parsing is
+        needed. Only the rows between `start` and `end` are converted, if they're given
+
+        Returns
+        -------
+        bool
+            whether the cache was used
+        """
+        path = path or self.db_path
+        paths = self.cache_paths(path)
+        try:
+            from pyarrow import feather
+        except ImportError:
+            return False
+        if not self.cache_current(path):
+            LOGGER.debug('Columnar cache is missing, older than the SQL database or from a window of the transactions')
+            return False
+
+        df = feather.read_table(paths[self.SQL_DF_TABLE], memory_map=True)
+        codes = feather.read_table(paths[self.SQL_SEL_TABLE], memory_map=True)
+        if start is not None or end is not None:
+            # both files were written from the same rows, so one mask works for both
+            dates = df.column(self.DF_DATE_COL).to_numpy()
+            mask = np.ones(dates.shape[0], dtype=bool)
+            if start is not None:
+                mask &= dates >= start.to_datetime64()
+            if end is not None:
+                mask &= dates < end.to_datetime64()
+            df, codes = df.filter(mask), codes.filter(mask)
+        self._df = df.to_pandas().set_index(self.DF_DATE_COL)
+        codes = codes.to_pandas().set_index(self.DF_DATE_COL)
+        patterns = feather.read_table(paths[self.SQL_PATTERN_TABLE], memory_map=True).to_pandas()
+        self._sel = SelectionMatrix(codes['code'].values, patterns.to_numpy(), patterns.columns, codes.index)
+        LOGGER.debug(f'Loaded columnar cache from {paths[self.SQL_DF_TABLE].parent}')
+        return True
+
+    @staticmethod
+    def table_exists(con, name: str) -> bool:
+        query = 'select count(*) from sqlite_master where type=\'table\' and name=?'
+        return con.execute(query, (name,)).fetchone()[0] > 0
+
+    def read_manifest(self, con) -> pd.DataFrame:
+        if self.table_exists(con, self.SQL_MANIFEST_TABLE):
+            return pd.read_sql_query(sql=f'select * from {self.SQL_MANIFEST_TABLE}', con=con)[MANIFEST_COLUMNS]
+        else:
+            return pd.DataFrame(columns=MANIFEST_COLUMNS)
+
+    def save_manifest(self, con):
+        create_table(con, self.SQL_MANIFEST_TABLE, self.manifest.astype({'size': np.int64, 'mtime': float}))
+
+    def update_sql(self, workers: int = None, executor: str = 'process'):
         '''
-        Loads fresh data from CSVs based on the yaml file, processes the yaml categories, and saves everything to the SQL database
+        Parses the CSV files that are new or changed according to the manifest, categorizes the transactions that aren't
+        already in the SQL database and appends them to it. If the queries or categories in the yaml file have changed
+        since the selections in the database were matched, everything gets processed and saved again
         '''
-        # OBSOLETE?
-        # need to load the SQL database first to get the notes
-        # with self.sql_context() as con:
-        #     self.note_manager.load_notes(con)
-        self.load_csv()
-        self.process_categories()
-        self.save_sql()
+        if self.db_path is None or not self.db_path.exists():
+            self.load_csv(workers, executor)
+            self.save_sql()
+            return
+
+        with self.sql_context() as con:
+            patterns = self.read_pattern_frame(con)
+            if self.table_exists(con, self.SQL_DF_TABLE) and patterns is not None:
+                known_ids = pd.read_sql_query(sql=f'select id from {self.SQL_DF_TABLE}', con=con)['id']
+                queries = self.read_queries(con)
+            else:
+                # the selections need to be saved again if they're in the old format
+                known_ids, queries = [], None
+
+        # transactions missing from the database and from the loaded transactions are filtered separately
+        df = self.read_new_csv(workers, executor)
+        sel = self.categorize(df)
+
+        # a query can be edited without renaming its category, so the queries themselves are compared
+        if queries == self.query_text and sel.pattern_frame().equals(patterns):
+            df = df.assign(Category=last_match(sel).values)
+            # codes need to refer to the patterns that are already in the database
+            sel = sel.merge_patterns(patterns.to_numpy())
+            if hasattr(self, '_df') and self._saved.get('path') == self.db_path.resolve():
+                # the loaded transactions match the database, so saving them only writes the new ones
+                new = ~(df['id'].isin(known_ids) | df['id'].isin(self._df['id'])).values
+                self.append_transactions(df[new], sel[new])
+                self.save_sql()
+                return
+
+            new = ~df['id'].isin(known_ids).values
+            LOGGER.debug(f'Appending {new.sum()} new transactions')
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                with self.sql_context() as con:
+                    df[new].to_sql(name=self.SQL_DF_TABLE, con=con, if_exists='append')
+                    self.save_selections(con, sel[new], df['id'].values[new], if_exists='append')
+                    self.save_manifest(con)
+                    self.fold_rollup_log(con)
+
+            if hasattr(self, '_df'):
+                new = ~df['id'].isin(self._df['id']).values
+                self.append_transactions(df[new], sel[new])
+        else:
+            LOGGER.debug('Categories have changed, processing all the transactions again')
+            if not hasattr(self, '_df'):
+                manifest = self.manifest
+                self.load_sql()
+                self._manifest = manifest
+            new = ~df['id'].isin(self._df['id']).values
+            self._df = pd.concat([self._df, df[new]]).sort_index(kind='mergesort')
+            self.process_categories()
+            self.save_sql()
+
+    @property
+    def search_index(self) -> TrigramIndex:
+        """Trigram index of the descriptions used by :meth:`search` when ``SEARCH_INDEX`` is set. Built the first time
+        it's needed after the transactions change
+
+        Returns
+        -------
+        :class:`~budget.search.TrigramIndex`
+        """
+        if not hasattr(self, '_search_index'):
+            search_col = self.df.filter(regex=re.compile('desc', re.IGNORECASE)).columns[0]
+            LOGGER.debug(f'Indexing {search_col}')
+            self._search_index = TrigramIndex(self.df[search_col])
+        return self._search_index
 
     def search(self, query: str) -> pd.Series:
         search_col = self.df.filter(regex=re.compile('desc', re.IGNORECASE)).columns[0]
@@ -310,7 +1037,9 @@ class BudgetData:
             assert all([isinstance(q, str) for q in query]), 'query must be all strings'
             query = '.*'.join([f'(?={q})' for q in query])
 
-        if isinstance(query, str):
+        if self.SEARCH_INDEX and isinstance(query, (str, re.Pattern)):
+            return self.search_index.search(query, case=not isinstance(query, str))
+        elif isinstance(query, str):
             return self.df[search_col].str.contains(query, case=False)
         else:
             try:
@@ -323,26 +1052,401 @@ class BudgetData:
 
     def search_notes(self, input) -> pd.DataFrame:
         if isinstance(input, str):
-            rgx = re.compile(input, re.IGNORECASE)
-            return self.df[self.id.isin([n.id for n in self._notes.values if rgx.search(n.note)])]
+            return self.df[self.id.isin(self.note_manager.contains(input, text=True).index)]
         elif isinstance(input, type):
-            return self.df[self.id.isin(self.note_manager.get_notes_by_type(input).apply(lambda n: n.id))]
+            table = self.note_manager.table
+            return self.df[self.id.isin(table['id'][self.note_manager.kind_mask(input)])]
         else:
             raise TypeError(f'invalid input for BudgetData.search_notes(): {input}')
 
     def report(self, selections, freq: str = None, avg: int = None) -> pd.DataFrame:
         if isinstance(selections, str):
             selections = [selections]
+        if not hasattr(self, '_df'):
+            return self.report_sql(selections, freq, avg)
 
+        if self.ROLLUP:
+            res = self.rollup_totals(selections)
+        else:
+            res = self.category_totals(selections)
+        return report(df=res, freq=freq, avg=avg)
+
+    def category_amounts(self, categories: List[str]) -> pd.Series:
+        """Renders each category once and puts the amounts of all of them together
+
+        Returns
+        -------
+        :class:`~pandas.Series`
+            amounts, indexed by the position of the category in `categories` and the date
+        """
         try:
-            res = pd.concat(
-                [self[sel].groupby(self[sel].index).sum().iloc[:, 0].rename(sel) for sel in selections],
-                axis=1
-            ).fillna(0)
+            # there should only be 1 column with numbers, the amounts column
+            amounts = [self[cat].select_dtypes('number').iloc[:, 0] for cat in categories]
         except KeyError as e:
             raise KeyError(f'invalid category: {e.args[0]}')
+        # tagged by position, so that the same category can be asked for more than once
+        return pd.concat(amounts, keys=range(len(categories)))
 
-        return report(df=res, freq=freq, avg=avg)
+    def rendered_cube(self, categories: List[str]) -> pd.DataFrame:
+        """Renders each category once and totals the amounts of all of them by date and category in a single pass
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            cube of the totals, see :mod:`budget.rollup`
+        """
+        amounts = self.category_amounts(categories)
+        return add(pd.DataFrame({
+            'Date': amounts.index.get_level_values(1),
+            'category': np.asarray(categories, dtype=object)[amounts.index.get_level_values(0)],
+            'Amount': to_units(amounts.values),
+            'n': 1
+        }))
+
+    def category_totals(self, categories: List[str]) -> pd.DataFrame:
+        """Totals each category by date from its rendered transactions, see :meth:`rendered_cube`. The amounts are
+        added up as whole numbers, so the totals don't depend on the order of the transactions and come out the same
+        as the ones from :attr:`rollup` or SQL
+
+        Parameters
+        ----------
+        categories : list of str
+            category names, which become the columns
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            total amount for each date that any of the categories has transactions on, ``0`` where a category doesn't
+        """
+        res = pivot(self.rendered_cube(pd.unique(np.asarray(categories, dtype=object)).tolist()), categories)
+        return res.rename_axis(self._df.index.name)
+
+    @property
+    def rollup(self) -> pd.DataFrame:
+        """Cube of the totals of the loaded transactions by date and category, before any notes are applied. Built in a
+        single pass over the transactions the first time it's needed after they or the selections change, see
+        :mod:`budget.rollup`
+        """
+        if not hasattr(self, '_rollup'):
+            totals = code_totals(self._df.index, self._sel.codes, self._df.select_dtypes('number').iloc[:, 0])
+            self._rollup = by_category(totals, self._sel.pattern_frame())
+        return self._rollup
+
+    def note_adjustments(self, categories: List[str] = None) -> pd.DataFrame:
+        """Changes that the notes make to the totals of each category by date. Only the transactions that the notes
+        refer to get rendered, since rendering leaves the rest of them as they are
+
+        Parameters
+        ----------
+        categories : list of str
+            categories to render, all of them by default
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            cube to add to the totals from before the notes were applied, like :attr:`rollup`
+        """
+        categories = self._sel.columns.tolist() if categories is None else pd.unique(np.asarray(categories)).tolist()
+        pos = self.id_positions(self.note_manager.noted_ids())
+        pos = np.unique(pos[pos >= 0])
+        if pos.shape[0] == 0:
+            return empty_cube()
+
+        view = self.partial_view(self._df.iloc[pos], self._sel.take(pos))
+        raw = view.rollup
+        return nonzero(add(view.rendered_cube(categories), negate(raw[raw['category'].isin(categories).values])))
+
+    @property
+    def notes_key(self) -> Tuple:
+        """Everything that decides how the notes get applied: the :class:`~budget.notes.NoteManager`, its version and
+        the ``Exclude Notes`` from the yaml file. Cubes of :meth:`note_adjustments` stay valid while this stays the same
+
+        Returns
+        -------
+        tuple
+        """
+        notes = self.note_manager
+        return id(notes), notes.version, self.exclude
+
+    def rollup_totals(self, categories: List[str]) -> pd.DataFrame:
+        """Same as :meth:`category_totals`, but put together from :attr:`rollup` and the :meth:`note_adjustments`
+        instead of rendering every transaction in the categories
+        """
+        for cat in categories:
+            if cat not in self._sel.columns:
+                raise KeyError(f'invalid category: {cat}')
+
+        # the adjustments for all the categories are kept until the transactions, the notes or the excluded notes change
+        if not hasattr(self, '_note_rollup') or self._note_rollup[0] != self.notes_key:
+            self._note_rollup = (self.notes_key, self.note_adjustments())
+        cube = pd.concat([self.rollup, self._note_rollup[1]])
+        cube = add(cube[cube['category'].isin(categories).values])
+        return pivot(cube, categories).rename_axis(self._df.index.name)
+
+    def read_code_totals(self, con, where: str = '') -> pd.DataFrame:
+        """Totals the amounts and counts the transactions in a SQL database by date and pattern code with a
+        ``GROUP BY``, like :func:`~budget.rollup.code_totals`. The amounts are converted to whole numbers in SQL, see
+        :data:`~budget.rollup.SQL_UNITS`
+        """
+        return pd.read_sql_query(
+            sql=f'select t."{self.DF_DATE_COL}" as Date, s.code, coalesce(sum({SQL_UNITS.format("t.Amount")}), 0) '
+                f'as Amount, count(*) as n '
+                f'from {self.SQL_DF_TABLE} t join {self.SQL_SEL_TABLE} s on s.id = t.id{where} '
+                f'group by t."{self.DF_DATE_COL}", s.code',
+            con=con,
+            parse_dates='Date'
+        )
+
+    def read_rollup(self, con, name: str, categories: List[str] = None) -> pd.DataFrame:
+        """Reads a cube saved by :meth:`write_rollup`, optionally only some of the categories
+        """
+        where = '' if categories is None else f' where category in ({", ".join("?" * len(categories))})'
+        cube = pd.read_sql_query(sql=f'select * from "{name}"{where}', con=con, params=categories)
+        # dates are stored as nanoseconds so that they compare exactly
+        return cube.assign(Date=pd.to_datetime(cube['Date'].values.astype(np.int64)))
+
+    def write_rollup(self, con, name: str, cube: pd.DataFrame, if_exists: str = 'replace'):
+        records = cube.assign(Date=cube['Date'].values.astype('datetime64[ns]').view(np.int64))
+        if if_exists == 'replace':
+            create_table(con, name, records, key=ROLLUP_KEYS)
+        else:
+            insert_rows(con, name, records)
+
+    def refresh_rollup(self, con) -> Optional[pd.DatetimeIndex]:
+        """Brings the rollup cube in a SQL database up to date with its transactions and selections. Triggers log the
+        dates of every change to those tables, so only the days in the log are totaled again. The whole cube gets built
+        again if it's missing, if the selection patterns changed or if any of the triggers are gone, which happens when
+        a table is replaced.
+
+        The cube has the notes applied with the adjustments that are saved alongside it, see
+        :meth:`sync_rollup_notes`
+
+        Parameters
+        ----------
+        con : :mod:`sqlite3` connection
+
+        Returns
+        -------
+        :class:`~pandas.DatetimeIndex`
+            days that were totaled again, or ``None`` if the whole cube was built again
+        """
+        # cubes saved before the amounts were whole numbers are built again from scratch, along with their notes
+        for name in (self.SQL_ROLLUP_TABLE, self.SQL_ROLLUP_NOTES_TABLE):
+            amount = con.execute(f'select type from pragma_table_info(?) where name = \'Amount\'', (name,)).fetchone()
+            if amount is not None and amount[0] != 'INTEGER':
+                con.execute(f'drop table "{name}"')
+
+        log = self.SQL_ROLLUP_LOG_TABLE
+        tracked = [
+            track_changes(con, self.SQL_DF_TABLE, log, self.DF_DATE_COL),
+            track_changes(con, self.SQL_SEL_TABLE, log, self.DF_DATE_COL),
+            # new patterns don't change the categories of any of the existing codes
+            track_changes(con, self.SQL_PATTERN_TABLE, log, events=('update', 'delete'))
+        ]
+        days = pd.read_sql_query(sql=f'select distinct date(value) as day from "{log}"', con=con)['day']
+        rebuild = (
+            not all(tracked) or days.isna().any() or
+            not self.table_exists(con, self.SQL_ROLLUP_TABLE) or
+            not self.table_exists(con, self.SQL_ROLLUP_NOTES_TABLE)
+        )
+        if not rebuild and days.shape[0] == 0:
+            return pd.DatetimeIndex([])
+
+        if self.table_exists(con, self.SQL_ROLLUP_NOTES_TABLE):
+            adjustments = self.read_rollup(con, self.SQL_ROLLUP_NOTES_TABLE)
+        else:
+            adjustments = empty_cube()
+            self.write_rollup(con, self.SQL_ROLLUP_NOTES_TABLE, adjustments)
+
+        patterns = self.read_pattern_frame(con)
+        if rebuild:
+            cube = add(by_category(self.read_code_totals(con), patterns), adjustments)
+            self.write_rollup(con, self.SQL_ROLLUP_TABLE, cube[cube['n'] != 0])
+            days = None
+            LOGGER.debug(f'Built the rollup cube with {cube.shape[0]} rows')
+        else:
+            days = pd.DatetimeIndex(pd.to_datetime(days))
+            totals = self.read_code_totals(
+                con, f' where date(t."{self.DF_DATE_COL}") in (select date(value) from "{log}")'
+            )
+            cube = add(
+                by_category(totals, patterns),
+                adjustments[adjustments['Date'].dt.normalize().isin(days).values]
+            )
+            con.executemany(
+                f'delete from "{self.SQL_ROLLUP_TABLE}" where "Date" >= ? and "Date" < ?',
+                zip(days.values.view(np.int64).tolist(), (days + pd.Timedelta(days=1)).values.view(np.int64).tolist())
+            )
+            self.write_rollup(con, self.SQL_ROLLUP_TABLE, cube[cube['n'] != 0], if_exists='append')
+            LOGGER.debug(f'Totaled {days.shape[0]} days of the rollup cube again')
+        con.execute(f'delete from "{log}"')
+        return days
+
+    def fold_rollup_log(self, con):
+        """Keeps a single entry for each day in the log of changes to the rollup cube, see :func:`~budget.sql.fold_log`.
+        Only :meth:`refresh_rollup` empties the log, so saves fold it to stop it from growing with every change in
+        between
+
+        Parameters
+        ----------
+        con : :mod:`sqlite3` connection
+        """
+        if self.table_exists(con, self.SQL_ROLLUP_LOG_TABLE):
+            fold_log(con, self.SQL_ROLLUP_LOG_TABLE, 'date(value)')
+
+    def sync_rollup_notes(self, con):
+        """Brings the notes applied to the rollup cube in a SQL database up to date with :attr:`note_manager`. The
+        adjustments for the notes are worked out again from the transactions they refer to, and only the ones that are
+        different from the saved ones get added to the cube
+
+        Parameters
+        ----------
+        con : :mod:`sqlite3` connection
+        """
+        noted = temp_ids(con, self.note_manager.noted_ids())
+        adjustments = self.partial_view(*self.read_sql_selected(con, f't.id in ({noted})')).note_adjustments()
+        change = nonzero(add(adjustments, negate(self.read_rollup(con, self.SQL_ROLLUP_NOTES_TABLE))))
+        records = change.assign(Date=change['Date'].values.astype('datetime64[ns]').view(np.int64))
+        con.executemany(
+            f'insert into "{self.SQL_ROLLUP_TABLE}" values (?, ?, ?, ?) on conflict ("Date", category) '
+            f'do update set Amount = Amount + excluded.Amount, n = n + excluded.n',
+            sql_records(records)
+        )
+        con.execute(f'delete from "{self.SQL_ROLLUP_TABLE}" where n = 0')
+        self.write_rollup(con, self.SQL_ROLLUP_NOTES_TABLE, adjustments)
+        LOGGER.debug(f'Changed {change.shape[0]} rows of the rollup cube for the notes')
+
+    def sql_pushdown(self, con) -> bool:
+        """Whether categories can be selected in a SQL database without loading it, which needs the selections to be
+        saved as pattern codes. Loads the notes from the database the first time, since they're needed for rendering
+        """
+        if self.db_path is None or not self.db_path.exists() or self.read_pattern_frame(con) is None or \
+                'code' not in table_columns(con, self.SQL_SEL_TABLE):
+            return False
+        if self._saved.get('path') != self.db_path.resolve():
+            self.note_manager.load_notes(con)
+            self._saved = {'path': self.db_path.resolve(), 'notes': True}
+        return True
+
+    def read_sql_selected(self, con, condition: str, params=()):
+        """Reads the transactions that match a condition, along with their selections
+
+        Parameters
+        ----------
+        con : :mod:`sqlite3` connection
+        condition : str
+            SQL condition on the transactions table as `t`, joined with the selections table as `s`
+        params :
+            parameters of the condition
+
+        Returns
+        -------
+        tuple
+            :class:`~pandas.DataFrame` of the transactions sorted by date, and their
+            :class:`~budget.selections.SelectionMatrix`
+        """
+        df = pd.read_sql_query(
+            sql=f'select t.*, s.code as "_sel_code" from {self.SQL_DF_TABLE} t '
+                f'join {self.SQL_SEL_TABLE} s on s.id = t.id where {condition} '
+                f'order by t."{self.DF_DATE_COL}", t.rowid',
+            con=con,
+            params=list(params),
+            index_col=self.DF_DATE_COL,
+            parse_dates=self.DF_DATE_COL
+        )
+        patterns = self.read_pattern_frame(con)
+        sel = SelectionMatrix(df.pop('_sel_code').values, patterns.to_numpy(), patterns.columns, df.index)
+        if 'Category' in df.columns:
+            df['Category'] = pd.Categorical(df['Category'], categories=sel.columns)
+        return df, sel
+
+    def partial_view(self, df: pd.DataFrame, sel: SelectionMatrix) -> 'BudgetData':
+        """Makes a :class:`BudgetData` with some of the transactions, sharing the configuration and notes of this one.
+        Rendering gives the same results as it does here, as long as the transactions include everything the notes
+        refer to
+        """
+        view = BudgetData(self.yaml_path)
+        view.note_manager = self.note_manager
+        view.RENDER_DROP_ID_COL = self.RENDER_DROP_ID_COL
+        view.RENDER_SORT = self.RENDER_SORT
+        view.SEARCH_INDEX = self.SEARCH_INDEX
+        view.ROLLUP = self.ROLLUP
+        view._df = df
+        view._sel = sel
+        return view
+
+    def query_category(self, category: str) -> pd.DataFrame:
+        """Selects and renders the transactions of a category straight from the SQL database at :attr:`db_path`, without
+        loading the rest of it. The selection is done in SQL with the pattern codes that include the category, along
+        with every transaction the notes refer to so that rendering has everything it needs
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            same as ``bd[category]`` with everything loaded
+        """
+        with self.sql_context() as con:
+            if not self.sql_pushdown(con):
+                LOGGER.debug('Selections can\'t be queried in SQL, loading everything')
+                self.load_sql()
+                return self[category]
+
+            patterns = self.read_pattern_frame(con)
+            if category not in patterns.columns:
+                raise KeyError(f'\'{category}\' is not a category. Valid categories:' + str(patterns.columns.tolist()))
+            codes = patterns.index[patterns[category].values].tolist()
+            noted = temp_ids(con, self.note_manager.noted_ids())
+            df, sel = self.read_sql_selected(
+                con,
+                f'(s.code in ({", ".join("?" * len(codes))}) or t.id in ({noted}))',
+                codes
+            )
+        return self.partial_view(df, sel)[category]
+
+    def report_sql(self, selections: List[str], freq: str = None, avg: int = None) -> pd.DataFrame:
+        """Makes the same report as :meth:`report` straight from the SQL database at :attr:`db_path`, without loading
+        the rest of it.
+
+        The totals come from the rollup cube, see :meth:`refresh_rollup`. When :attr:`ROLLUP` is off, they're summed
+        up by date and pattern code with a SQL ``GROUP BY`` instead, and each category is the sum over the codes that
+        include it. Either way, only the few transactions that the notes refer to get rendered, and the amounts are
+        added up as whole numbers so that the totals are exactly the same as the ones from :meth:`category_totals`
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+        """
+        with self.sql_context() as con:
+            if not self.sql_pushdown(con):
+                LOGGER.debug('Selections can\'t be queried in SQL, loading everything')
+                self.load_sql()
+                return self.report(selections, freq, avg)
+
+            patterns = self.read_pattern_frame(con)
+            for cat in selections:
+                if cat not in patterns.columns:
+                    raise KeyError(f'invalid category: {cat}')
+            categories = pd.unique(np.asarray(selections)).tolist()
+            if self.ROLLUP:
+                days = self.refresh_rollup(con)
+                # the notes only need to be applied again if something changed since this last applied them
+                saved = self.read_rollup(con, self.SQL_ROLLUP_NOTES_TABLE)
+                synced = getattr(self, '_synced_notes', None)
+                if days is None or days.shape[0] > 0 or synced is None or \
+                        synced[0] != self.notes_key or not synced[1].equals(saved):
+                    self.sync_rollup_notes(con)
+                    saved = self.read_rollup(con, self.SQL_ROLLUP_NOTES_TABLE)
+                self._synced_notes = (self.notes_key, saved)
+                cube = self.read_rollup(con, self.SQL_ROLLUP_TABLE, categories)
+            else:
+                noted = temp_ids(con, self.note_manager.noted_ids())
+                view = self.partial_view(*self.read_sql_selected(con, f't.id in ({noted})'))
+                cube = add(
+                    by_category(self.read_code_totals(con), patterns[categories]),
+                    view.note_adjustments(categories)
+                )
+
+        return report(df=pivot(cube, selections).rename_axis(self.DF_DATE_COL), freq=freq, avg=avg)
 
     def render(self, df: pd.DataFrame, category: str = None, drop_id=None, sort=None) -> pd.DataFrame:
         """
@@ -420,28 +1524,47 @@ class BudgetData:
 
     def linked_sources(self, df: pd.DataFrame):
         # select from the main DataFrame
-        return self._df[
-            # transactions with Link notes attached that target transactions in the DataFrame
-            self.id.isin(self.note_manager.linked_ids(df))
-        ]
+        # transactions with Link notes attached that lead to transactions in the DataFrame
+        pos = self.id_positions(self.note_manager.linked_ids(df))
+        return self._df.iloc[np.unique(pos[pos >= 0])]
 
     def add_note(self, df: pd.DataFrame, note: str) -> None:
         if isinstance(df, pd.Series):
             df = pd.DataFrame(df).transpose()
-        df = self.hash_transactions(df)
-        for h in df['id'].values:
-            self.note_manager.add_note(h, note, drop_dups=False)
-        self.note_manager.drop_duplicates()
+        if 'id' not in df.columns:
+            df = self.hash_transactions(df)
+        self.note_manager.add_notes(df['id'].values, note)
 
     def find_by_id(self, id_to_find: str) -> pd.Series:
-        try:
-            return self._df.reset_index().set_index('id', drop=False).loc[id_to_find]
-        except KeyError as e:
+        pos = self.id_positions([id_to_find])[0]
+        if pos < 0:
             LOGGER.warning(f'{id_to_find} not found in transactions')
-            return pd.Series()
+            return pd.Series(dtype=object)
+        return self._df.iloc[[pos]].reset_index().iloc[0].rename(id_to_find)
 
     def df_from_ids(self, ids) -> pd.DataFrame:
-        return pd.Series(ids).apply(lambda id: self.find_by_id(id)).set_index('Date')
+        """Selects the transactions for a sequence of ids all at once, in the same order as the ids. Ids that aren't
+        in the transactions get a row of ``NaN``
+
+        Parameters
+        ----------
+        ids : iterable of str
+            transaction ids, which can be repeated
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+        """
+        pos = self.id_positions(ids)
+        found = pos >= 0
+        if not found.all():
+            LOGGER.warning(f'{(~found).sum()} ids not found in transactions')
+
+        df = self._df.iloc[pos[found]].reset_index()
+        if not found.all():
+            df.index = np.flatnonzero(found)
+            df = df.reindex(np.arange(pos.shape[0]))
+        return df.set_index(self._df.index.name or 'Date')
 
     def note_search(self, query: str) -> pd.DataFrame:
         notes = self.note_manager.contains(query, text=True)
@@ -459,7 +1582,8 @@ class BudgetData:
 
     def note_df(self, df: pd.DataFrame) -> pd.DataFrame:
         try:
-            directly_attached_note_ids = df['id'][df['id'].isin(self.note_manager.notes.index)].values
+            table = self.note_manager.table
+            directly_attached_note_ids = df['id'][df['id'].isin(table['id'])].values
             linked_note_ids = self.note_manager.linked_ids(df)
             ids = np.union1d(
                 directly_attached_note_ids,
@@ -468,7 +1592,7 @@ class BudgetData:
 
             # using the transaction ids to index the notes
             # this will also pick up multiple notes attached to a single transaction
-            notes = self._notes.loc[ids]
+            notes = self.note_manager.note_text.loc[ids]
         except KeyError:
             # happens when there are no notes
             print('no notes')
@@ -480,16 +1604,16 @@ class BudgetData:
                 # also happens when there are no notes
                 return pd.DataFrame(columns=df.columns.tolist() + ['Note'])
             else:
-                res['Note'] = notes.apply(lambda n: n.note if isinstance(n, Note) else '').values
-                linked_targets = np.unique(self._notes.loc[linked_note_ids].apply(lambda n: n.target).values)
+                res['Note'] = notes.values
+                linked = self.note_manager.kind_mask(Link) & table['id'].isin(linked_note_ids).values
+                linked_targets = np.unique(table['target'].values[linked].astype(str))
                 linked_sources = self._df[self.id.isin(linked_targets)]
                 res = res.append(linked_sources, sort=False)
                 return res.sort_index()
 
     @property
     def orphaned_notes(self):
-        notes = self._notes
-        return notes[~notes.index.isin(self.id)]
+        return self.note_manager.note_objects(~self.note_manager.table['id'].isin(self.id))
 
     def drop_orphan_notes(self):
         return self.note_manager.drop_orphans(ids=self.id)
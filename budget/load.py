@@ -1,30 +1,215 @@
 import hashlib
 import logging
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 import yaml
 LOGGER = logging.getLogger(__name__)
+MANIFEST_COLUMNS = ['path', 'size', 'mtime', 'hash']
+_CONFIG_CACHE = {}
 
 
-def load_from_cfg_path(config_path: Path) -> pd.DataFrame:
-    with Path(config_path).open('r') as file:
+def load_config(config_path: Path) -> Dict:
+    """Loads the configuration `dict` from a yaml file, reusing the already parsed one if the file hasn't changed.
+
+    The cache is keyed on the resolved path and checked against the size and modification time of the file, so every
+    :class:`~budget.BudgetData` and :class:`~budget.plan.BudgetPlan` pointing to the same file shares one parsed copy.
+    The returned `dict` is shared and shouldn't be modified
+
+    Parameters
+    ----------
+    config_path : :class:`~pathlib.Path`
+        path to the yaml configuration file
+
+    Returns
+    -------
+    dict
+    """
+    config_path = Path(config_path).resolve()
+    stat = config_path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    try:
+        cached_key, cfg = _CONFIG_CACHE[config_path]
+        if cached_key == key:
+            return cfg
+    except KeyError:
+        pass
+
+    LOGGER.debug(f'Parsing {config_path.name}')
+    with config_path.open('r') as file:
         cfg = yaml.load(file, Loader=yaml.SafeLoader)
-        return load_all_accounts(cfg['Loading']['Accounts'], Path(cfg['Loading']['base']))
+    _CONFIG_CACHE[config_path] = (key, cfg)
+    return cfg
 
 
-def load_all_accounts(cfg, base: Path):
-    return pd.concat(account_df_gen(cfg, base)).drop_duplicates('id').sort_index()
+def load_from_cfg_path(config_path: Path, workers: int = None) -> pd.DataFrame:
+    cfg = load_config(config_path)
+    return load_all_accounts(cfg['Loading']['Accounts'], Path(cfg['Loading']['base']), workers=workers)
+
+
+def load_all_accounts(cfg, base: Path, workers: int = None, executor: str = 'process'):
+    """Loads the CSV files for all the accounts into a single :class:`~pandas.DataFrame`, dropping any transactions
+    that show up in more than one file
+
+    Parameters
+    ----------
+    cfg : :class:`dict`
+        ``Accounts`` section of the yaml configuration
+    base : :class:`~pathlib.Path`
+        folder containing a sub-folder of CSV files for each account
+    workers : :class:`int`
+        number of files to parse concurrently. ``None`` or ``1`` loads them serially
+    executor : :class:`str`
+        ``'process'`` or ``'thread'``, the kind of pool used when `workers` is more than 1
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+    """
+    return pd.concat(account_df_gen(cfg, base, workers, executor)).drop_duplicates('id').sort_index()
 
 
-def account_df_gen(cfg, base: Path):
+def account_files(cfg, base: Path):
+    """Generator that yields ``(account name, loader name, file path)`` for every CSV file of every account, in a
+    deterministic order
+    """
     for name, account_cfg in cfg.items():
-        loader_name = account_cfg['loader']
-        for f in (base / name).glob('*.csv'):
-            df = globals()[loader_name](f)
-            df['Account'] = name
-            yield df
+        for f in sorted((base / name).glob('*.csv')):
+            yield name, account_cfg['loader'], f
+
+
+def account_df_gen(cfg, base: Path, workers: int = None, executor: str = 'process'):
+    """Generator that yields a :class:`~pandas.DataFrame` for each CSV file of each account, see
+    :func:`~budget.load.load_files`
+    """
+    for file_info, df in load_files(list(account_files(cfg, base)), workers, executor):
+        yield df
+
+
+def load_files(files: List[Tuple[str, str, Path]], workers: int = None, executor: str = 'process'):
+    """Generator that parses ``(account name, loader name, file path)`` tuples, yielding ``(file tuple, DataFrame)``
+    for each file that loads successfully.
+
+    Files are yielded in the same order whether or not they are parsed concurrently. A file that fails to load is
+    logged and skipped instead of stopping the rest of the batch
+    """
+    if workers is None or workers <= 1:
+        results = map(try_load_account_file, files)
+        yield from _report_errors(files, results)
+    else:
+        try:
+            pool_cls = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}[executor]
+        except KeyError:
+            raise ValueError(f'Invalid executor: {executor}')
+
+        with pool_cls(max_workers=workers) as pool:
+            # Executor.map returns results in the order they were submitted
+            results = pool.map(try_load_account_file, files)
+            yield from _report_errors(files, results)
+
+
+def _report_errors(files, results):
+    for file_info, (df, error) in zip(files, results):
+        if error is None:
+            yield file_info, df
+        else:
+            name, loader_name, f = file_info
+            LOGGER.error(f'Failed to load {name} file {f.name}: {error!r}')
+
+
+def file_hash(filepath: Path) -> str:
+    """`md5` hex digest of the contents of a file
+    """
+    m = hashlib.md5()
+    with Path(filepath).open('rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            m.update(chunk)
+    return m.hexdigest()
+
+
+def file_signature(filepath: Path) -> Dict:
+    """Makes a manifest entry for a file
+
+    Returns
+    -------
+    dict
+        ``path``, ``size``, ``mtime`` and content ``hash`` of the file
+    """
+    stat = filepath.stat()
+    return {
+        'path': str(filepath.resolve()),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': file_hash(filepath)
+    }
+
+
+def changed_files(files: List[Tuple[str, str, Path]], manifest: pd.DataFrame) -> Tuple[List, List[Dict]]:
+    """Compares ``(account name, loader name, file path)`` tuples against a manifest of previously ingested files.
+
+    Files with the same size and modification time as their manifest entry are assumed unchanged. Content hashes are
+    only computed for the rest, so a file that was touched without being modified doesn't get parsed again.
+
+    Parameters
+    ----------
+    files : list
+        tuples from :func:`~budget.load.account_files`
+    manifest : :class:`~pandas.DataFrame`
+        ``path``, ``size``, ``mtime`` and ``hash`` of the files that have already been ingested
+
+    Returns
+    -------
+    tuple
+        the file tuples that are new or changed, and refreshed manifest entries for the files that were touched but
+        have the same contents
+    """
+    known = manifest.set_index('path')
+    changed, refreshed = [], []
+    for file_info in files:
+        path = str(file_info[2].resolve())
+        if path in known.index:
+            entry = known.loc[path]
+            stat = file_info[2].stat()
+            if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+                continue
+            signature = file_signature(file_info[2])
+            if signature['hash'] == entry['hash']:
+                refreshed.append(signature)
+                continue
+        changed.append(file_info)
+    return changed, refreshed
+
+
+def update_manifest(manifest: pd.DataFrame, signatures: List[Dict]) -> pd.DataFrame:
+    """Adds or replaces manifest entries using the ``path`` of each one
+    """
+    if len(signatures) == 0:
+        return manifest
+    return (
+        pd.concat([manifest, pd.DataFrame(signatures, columns=MANIFEST_COLUMNS)], ignore_index=True)
+        .drop_duplicates('path', keep='last')
+        .reset_index(drop=True)
+    )
+
+
+def load_account_file(name: str, loader_name: str, filepath: Path) -> pd.DataFrame:
+    df = globals()[loader_name](filepath)
+    df['Account'] = name
+    return df
+
+
+def try_load_account_file(file_info) -> tuple:
+    """Calls :func:`~budget.load.load_account_file`, returning ``(DataFrame, None)`` on success or ``(None, exception)``
+    so that one bad file doesn't abort the other files in a batch
+    """
+    try:
+        return load_account_file(*file_info), None
+    except Exception as e:
+        return None, e
 
 
 def load_transaction_file(filepath: Path, **kwargs) -> pd.DataFrame:
@@ -49,7 +234,7 @@ def load_transaction_file(filepath: Path, **kwargs) -> pd.DataFrame:
             .set_index('Date')
     )
     df = df[['Amount', 'Description']]
-    df['id'] = df.apply(hash, axis=1)
+    df['id'] = hash_df(df)
 
     return df.sort_index()
 
@@ -75,6 +260,44 @@ def hash(row: pd.Series) -> str:
     return m.hexdigest()
 
 
+def hash_df(df: pd.DataFrame) -> pd.Series:
+    """Batch version of :func:`~budget.load.hash` that computes the IDs for a whole :class:`~pandas.DataFrame` at once.
+
+    The date strings, encoded descriptions and 24 byte ``Amount`` values are all prepared column-wise, leaving only the
+    `md5` digest itself to be done per row. The resulting digests are identical to those from :func:`~budget.load.hash`
+
+    Parameters
+    ----------
+    df : :class:`~pandas.DataFrame`
+        transactions with a :class:`~pandas.DatetimeIndex` and ``Description`` and ``Amount`` columns
+
+    Returns
+    -------
+    :class:`~pandas.Series`
+        :class:`str` hex digests with the same index as `df`
+    """
+    # transactions share a small number of distinct dates, so each one only gets formatted once
+    codes, uniques = pd.factorize(pd.DatetimeIndex(df.index))
+    dates = np.array([d.encode('UTF-8', 'strict') for d in uniques.strftime('%Y-%m-%d')], dtype=object)
+    dates = dates[codes] if dates.size else dates
+    descs = [d.encode('UTF-8', 'strict') for d in df['Description'].values]
+
+    # 24 byte big-endian two's complement, built from the 8 byte value and 16 bytes of sign extension
+    cents = (df['Amount'].to_numpy(dtype=float) * 100).astype(np.int64)
+    amts = np.empty((cents.shape[0], 24), dtype=np.uint8)
+    amts[:, :16] = np.where(cents < 0, 0xff, 0x00)[:, np.newaxis]
+    amts[:, 16:] = cents.astype('>i8').view(np.uint8).reshape(-1, 8)
+    amts = [a.tobytes() for a in amts]
+
+    md5 = hashlib.md5
+    return pd.Series(
+        [md5(d + desc + a).hexdigest() for d, desc, a in zip(dates, descs, amts)],
+        index=df.index,
+        name='id',
+        dtype='object'
+    )
+
+
 def load_chase(filepath: Path) -> pd.DataFrame:
     return load_transaction_file(filepath)
 
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from ..utils import row_positions
+
+
+class LinkGraph:
+    """Graph of the :class:`~budget.notes.Link` notes, with each link resolved through any chain of links after it
+
+    When transaction A is linked to B and B is linked to C, A's link continues on to C. Each link gets a `path` of the
+    transactions it leads to: its own target first, followed by the target of the most recent link from that
+    transaction, and so on until reaching a transaction that isn't linked anywhere or coming back around to a
+    transaction that's already in the path.
+
+    Attributes
+    ----------
+    sources : :class:`~numpy.ndarray`
+        id of the transaction each link is attached to, in the order of the notes
+    targets : :class:`~numpy.ndarray`
+        id of the transaction each link points at
+    paths : :class:`~numpy.ndarray`
+        2D :class:`object` array with one row per link and one column per step along its chain, padded with ``None``
+    """
+
+    def __init__(self, sources, targets):
+        self.sources = np.asarray(sources, dtype='object')
+        self.targets = np.asarray(targets, dtype='object')
+
+        # the most recent link from each transaction is the one that chains onto the next transaction
+        latest = ~pd.Index(self.sources).duplicated(keep='last')
+        next_index = pd.Index(self.sources[latest], dtype='object')
+        next_targets = np.append(self.targets[latest], None)
+
+        steps = [self.targets]
+        visited = [self.sources, self.targets]
+        current = self.targets
+        active = np.ones(self.targets.shape[0], dtype=bool)
+        while True:
+            current = next_targets[next_index.get_indexer(pd.Index(current, dtype='object'))]
+            # stops at the end of a chain or when the chain loops back on itself
+            active &= pd.notna(current)
+            for v in visited:
+                active &= current != v
+            if not active.any():
+                break
+            current = np.where(active, current, None)
+            steps.append(current)
+            visited.append(current)
+        self.paths = np.stack(steps, axis=1) if self.targets.shape[0] > 0 else np.empty((0, 1), dtype='object')
+
+    def __len__(self) -> int:
+        return self.sources.shape[0]
+
+    def reaches(self, ids) -> np.ndarray:
+        """:class:`bool` mask of the links whose path goes through any of the given transaction ids
+        """
+        # the ids can be repeated, like when a transaction is selected more than once by the notes of a category
+        ids = pd.Index(ids, dtype='object').unique()
+        res = np.zeros(len(self), dtype=bool)
+        for step in self.paths.T:
+            res |= ids.get_indexer(pd.Index(step, dtype='object')) >= 0
+        return res
+
+    def destinations(self, ids: pd.Series) -> np.ndarray:
+        """Finds where each link ends up within a column of transaction ids, which is the furthest transaction along
+        its path that's in the ids
+
+        Parameters
+        ----------
+        ids : :class:`~pandas.Series`
+            ids of the transactions, usually the ``id`` column of a :class:`~pandas.DataFrame`
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+            position of the destination in the ids for each link, ``-1`` if none of its path is in the ids
+        """
+        res = np.full(len(self), -1)
+        for step in self.paths.T[::-1]:
+            res = np.where(res >= 0, res, row_positions(ids, step))
+        return res
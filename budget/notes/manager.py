@@ -1,37 +1,252 @@
 import logging
 import re
+import sqlite3
 from typing import List
 
 import numpy as np
 import pandas as pd
 
-from . import note, split
+from ..search import literal_text
+from ..sql import changed_keys, create_table, delete_rows, fingerprints, insert_rows, key_column, table_columns, \
+    upsert_rows
+from ..utils import row_positions
+from . import note
+from .links import LinkGraph
 from .note import Note, Link, Category
-from .split import SplitNote
+from .split import SplitAmount, SplitNote
 
 LOGGER = logging.getLogger(__name__)
 NOTE_PARSE_REGEX = re.compile('id=\'([\d\w]+)\', note=\'([\d\w :,]+)\'')
+NOTE_TYPES = {nt.__name__: nt for nt in [Note, Link, Category, SplitNote]}
+NOTE_COLUMNS = ['id', 'kind', 'note', 'target', 'category']
+SPLIT_COLUMNS = ['key', 'id', 'category', 'kind', 'value']
+
+
+def occurrence_rounds(values: np.ndarray):
+    """Generator that splits an array into rounds that each contain any value at most once, keeping repeated values in
+    their original order. Yields a :class:`bool` mask for each round
+    """
+    if len(values) == 0:
+        return
+    occurrence = pd.Series(values).groupby(values).cumcount().values
+    for i in range(occurrence.max() + 1):
+        yield occurrence == i
+
+
+def with_amounts(df: pd.DataFrame, amounts: np.ndarray) -> pd.DataFrame:
+    """Copies a :class:`~pandas.DataFrame` of transactions with new amounts. The ``id`` column is moved to the front,
+    which is where notes have always left it
+    """
+    res = df[['id'] + [col for col in df.columns if col != 'id']].copy()
+    res['Amount'] = amounts
+    return res
+
 
 class NoteManager:
     """Class to handle higher-level :class:`~budget.Note` manipulation
 
+    The notes are stored in columns, so looking them up by transaction, type, category or link target doesn't need to
+    go through every :class:`~budget.Note` object. The objects are only created when they're asked for, see
+    :attr:`notes`
+
     Attributes
     ----------
-    notes : :class:`~pandas.DataFrame`
-        :class:`~pandas.DataFrame` of the :class:`~budget.Note` objects. `Index` is the :class:`str` ID of the
-        transaction that each :class:`~budget.Note` is linked to
-
+    table : :class:`~pandas.DataFrame`
+        one row per note, indexed by an :class:`int` `key`. Columns are the ``id`` of the transaction the note is
+        attached to, the ``kind`` of note (the name of its class), the ``note`` text, the ``target`` of
+        :class:`~budget.notes.Link` notes and the ``category`` of :class:`~budget.notes.Category` notes
+    splits : :class:`~pandas.DataFrame`
+        one row for each part of each :class:`~budget.notes.SplitNote`, with the `key` and ``id`` of the note, the
+        ``category`` of the part, the ``kind`` of split and its ``value``
+    version : int
+        goes up every time :attr:`table` changes, so that anything worked out from the notes can tell when it's out of
+        date
     """
     SQL_NOTE_TABLE = 'notes'
+    SQL_SPLIT_TABLE = 'note_splits'
+    SQL_FTS_TABLE = 'note_fts'
 
     def __init__(self):
-        self.notes = pd.Series(name='note', dtype='object')
+        self.version = 0
+        self.table = pd.DataFrame(columns=NOTE_COLUMNS, dtype='object').rename_axis('key')
+        self.splits = pd.DataFrame(columns=SPLIT_COLUMNS, dtype='object')
+        self._objects = {}
+        self._next_key = 0
+        self._fts = None
+        self._fts_keys = np.array([], dtype=np.int64)
+        self._saved = None
         self.logger = logging.getLogger(__name__)
 
-    def load_notes(self, con) -> pd.Series:
-        """Loads the :class:`~budget.Note` :class:`~pandas.Series` using a connection to a SQL database using
+    @property
+    def table(self) -> pd.DataFrame:
+        return self._table
+
+    @table.setter
+    def table(self, table: pd.DataFrame):
+        self._table = table
+        self.version += 1
+        if hasattr(self, '_link_graph'):
+            del self._link_graph
+
+    @property
+    def link_graph(self) -> LinkGraph:
+        """:class:`~budget.notes.links.LinkGraph` of the :class:`~budget.notes.Link` notes. Built the first time it's
+        needed after the notes change
+        """
+        if not hasattr(self, '_link_graph'):
+            links = self.table[self.kind_mask(Link)]
+            self._link_graph = LinkGraph(links['id'].values, links['target'].values)
+        return self._link_graph
 
+    @property
+    def notes(self) -> pd.Series:
+        """:class:`~pandas.Series` of the :class:`~budget.Note` objects. `Index` is the :class:`str` ID of the
+        transaction that each :class:`~budget.Note` is linked to. Objects are created the first time they're needed and
+        reused after that. Assigning a :class:`~pandas.Series` of :class:`~budget.Note` objects replaces all the notes
+        """
+        return self.note_objects()
 
+    @notes.setter
+    def notes(self, notes: pd.Series):
+        self.table = self.table.iloc[:0]
+        self.splits = self.splits.iloc[:0]
+        self._objects = {}
+        self.add_objects(list(notes))
+
+    def note_objects(self, mask=None) -> pd.Series:
+        """Makes the :class:`~budget.Note` objects for some of the rows in :attr:`table`
+
+        Parameters
+        ----------
+        mask : :class:`~pandas.Series` or :class:`~numpy.ndarray`
+            :class:`bool` mask of the rows to use, all of them by default
+
+        Returns
+        -------
+        :class:`~pandas.Series`
+            :class:`~budget.Note` objects, indexed by the ids of their transactions
+        """
+        table = self.table if mask is None else self.table[np.asarray(mask, dtype=bool)]
+        objects = self._objects
+        for key, id, kind, text in zip(table.index, table['id'].values, table['kind'].values, table['note'].values):
+            if key not in objects:
+                try:
+                    objects[key] = NOTE_TYPES[kind](id, text)
+                except KeyError:
+                    objects[key] = self.parse_note(id, text)
+        # np.fromiter avoids numpy checking whether each of the dataclass objects is a sequence
+        values = np.fromiter((objects[key] for key in table.index), dtype=object, count=table.shape[0])
+        return pd.Series(values, index=table['id'].values, name='note', dtype='object')
+
+    def add_objects(self, notes: List[Note]):
+        """Adds :class:`~budget.Note` objects to the columns in :attr:`table` and :attr:`splits`
+
+        Parameters
+        ----------
+        notes : list of :class:`~budget.Note`
+            notes to add, in order
+        """
+        keys = range(self._next_key, self._next_key + len(notes))
+        self._next_key += len(notes)
+
+        rows = [
+            (n.id, type(n).__name__, n.note, getattr(n, 'target', None), getattr(n, 'category', None))
+            for n in notes
+        ]
+        split_rows = [
+            (key, n.id, cat, type(part).__name__ if part is not None else None, getattr(part, 'value', np.nan))
+            for key, n in zip(keys, notes) if isinstance(n, SplitNote)
+            for cat, part in n.parts.items()
+        ]
+        self._objects.update(zip(keys, notes))
+        self.append_rows(
+            pd.DataFrame(rows, columns=NOTE_COLUMNS, index=pd.Index(keys, name='key'), dtype='object'),
+            pd.DataFrame(split_rows, columns=SPLIT_COLUMNS)
+        )
+
+    def add_notes(self, ids, note: str, drop_dups: bool = True):
+        """Attaches the same note to many transactions at once. The note is only parsed once and all the rows are
+        added in one go, without creating any :class:`~budget.Note` objects
+
+        Parameters
+        ----------
+        ids : iterable of str
+            ids of the transactions to attach the note to
+        note : str
+            input string used to create the notes
+        drop_dups : bool
+            Whether to skip the ids that already have this exact note, along with repeated ids
+        """
+        ids = np.asarray(ids, dtype='object').reshape(-1)
+        if drop_dups:
+            ids = pd.unique(ids)
+            ids = ids[~pd.Index(ids).isin(self.table['id'][(self.table['note'] == note).values])]
+        if ids.shape[0] == 0:
+            return
+
+        # the type of note and what it contains only depend on the text
+        n = self.parse_note(ids[0], note)
+        keys = pd.RangeIndex(self._next_key, self._next_key + ids.shape[0], name='key')
+        self._next_key += ids.shape[0]
+
+        rows = pd.DataFrame(
+            {
+                'id': ids,
+                'kind': type(n).__name__,
+                'note': note,
+                'target': getattr(n, 'target', None),
+                'category': getattr(n, 'category', None)
+            },
+            index=keys, columns=NOTE_COLUMNS, dtype='object'
+        )
+        parts = list(n.parts.items()) if isinstance(n, SplitNote) else []
+        split_rows = pd.DataFrame(
+            {
+                'key': np.repeat(keys.values, len(parts)),
+                'id': np.repeat(ids, len(parts)),
+                'category': [cat for cat, part in parts] * ids.shape[0],
+                'kind': [type(part).__name__ if part is not None else None for cat, part in parts] * ids.shape[0],
+                'value': [getattr(part, 'value', np.nan) for cat, part in parts] * ids.shape[0]
+            },
+            columns=SPLIT_COLUMNS
+        )
+        self.append_rows(rows, split_rows)
+
+    def append_rows(self, rows: pd.DataFrame, split_rows: pd.DataFrame):
+        """Adds rows onto the end of :attr:`table` and :attr:`splits`
+        """
+        if rows.shape[0] > 0:
+            self.table = pd.concat([self.table, rows]) if self.table.shape[0] > 0 else rows
+        if split_rows.shape[0] > 0:
+            if self.splits.shape[0] > 0:
+                self.splits = pd.concat([self.splits, split_rows], ignore_index=True)
+            else:
+                self.splits = split_rows
+
+    def keep(self, mask):
+        """Keeps only some of the notes, dropping the rest along with their split parts and cached objects
+
+        Parameters
+        ----------
+        mask : :class:`~pandas.Series` or :class:`~numpy.ndarray`
+            :class:`bool` mask of the rows in :attr:`table` to keep
+        """
+        mask = np.asarray(mask, dtype=bool)
+        for key in self.table.index[~mask]:
+            self._objects.pop(key, None)
+        self.table = self.table[mask]
+        self.splits = self.splits[self.splits['key'].isin(self.table.index)]
+
+    def kind_mask(self, typ: type) -> np.ndarray:
+        """:class:`bool` mask of the rows in :attr:`table` with notes of the given type
+        """
+        return (self.table['kind'] == typ.__name__).values
+
+    def load_notes(self, con) -> pd.DataFrame:
+        """Loads the notes from a SQL database straight into :attr:`table` and :attr:`splits`, without parsing any of
+        them. The notes keep the keys they were saved with, which lets :meth:`save_notes` only write the ones that
+        change. A `notes` table in the old format, with the :func:`repr` of each :class:`~budget.Note`, is converted and
+        saved in the new format, see :meth:`migrate_notes`
 
         Parameters
         ----------
@@ -40,26 +255,70 @@ class NoteManager:
 
         Returns
         -------
-        :class:`~pandas.Series`
+        :class:`~pandas.DataFrame`
+            :attr:`table`
         """
 
         # Read the whole table of notes
         notes = pd.read_sql_query(sql=f'select * from {self.SQL_NOTE_TABLE}', con=con)
-
         self.logger.debug(f'{notes.shape[0]} notes loaded from \'{self.SQL_NOTE_TABLE}\'')
 
+        if 'kind' not in notes.columns:
+            return self.migrate_notes(con, notes)
+
+        splits = pd.read_sql_query(sql=f'select * from {self.SQL_SPLIT_TABLE}', con=con)
+        notes = notes.set_index('key').sort_index()
+        keys = notes.index.astype(np.int64)
+        self._next_key = max(self._next_key, keys.max() + 1 if keys.shape[0] > 0 else 0)
+
+        # missing targets, categories and kinds of split come back as NaN
+        self.table = notes.reindex(columns=NOTE_COLUMNS).astype('object').set_axis(keys)
+        self.table = self.table.where(self.table.notna(), None)
+        splits['key'] = splits['key'].values.astype(np.int64)
+        splits = splits.reindex(columns=SPLIT_COLUMNS)
+        for col in ['id', 'category', 'kind']:
+            splits[col] = splits[col].astype('object').where(splits[col].notna(), None)
+        self.splits = splits
+        self._objects = {}
+
+        # keys are kept from the database, so the ones in the search index could now belong to different notes
+        if self._fts:
+            with self._fts:
+                self._fts.execute(f'delete from {self.SQL_FTS_TABLE}')
+        self._fts_keys = np.array([], dtype=np.int64)
+
+        # databases saved before the notes had a primary key get written in full the next time they're saved
+        if key_column(con, self.SQL_NOTE_TABLE) == 'key':
+            self._saved = fingerprints(self.sql_frames()[0], 'key')
+        else:
+            self._saved = None
+        return self.table
+
+    def migrate_notes(self, con, notes: pd.DataFrame) -> pd.DataFrame:
+        """Converts a `notes` table in the old format, which has the :func:`repr` of each :class:`~budget.Note` in its
+        only column, and replaces it with the new format using :meth:`save_notes`
+
+        Parameters
+        ----------
+        con : SQLAlchemy connectable, :class:`str`, or :mod:`sqlite3` connection
+            SQL connection
+        notes : :class:`~pandas.DataFrame`
+            contents of the old `notes` table
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            :attr:`table`
+        """
+        self.logger.debug(f'Converting {notes.shape[0]} notes from the old format')
+
         # Set up the index, which will be the ID of the transaction the note is attached to
-        notes.set_index(notes.columns[0], inplace=True)
+        notes = notes.set_index(notes.columns[0])
 
-        try:
-            # Select only the first column (should only be one)
-            notes = notes.iloc[:, 0].map(NoteManager.eval_note)
-        except NameError:
-            self.logger.debug('No notes loaded')
-            pass
-        # Assign to attribute
-        self.notes = notes
-        return notes
+        # Select only the first column (should only be one)
+        self.notes = notes.iloc[:, 0].map(NoteManager.eval_note)
+        self.save_notes(con)
+        return self.table
 
     @staticmethod
     def eval_note(input: str) -> note.Note:
@@ -140,11 +399,10 @@ class NoteManager:
             `True` if all of the `Notes` in the :class:`~budget.notes.NoteManager` are in the given list of IDs
         """
 
-        return self.notes.map(lambda n: n.id).isin(ids).all()
+        return self.table['id'].isin(ids).all()
 
     def add_note(self, id: str, note: str, drop_dups: bool = True):
-        """Parses a string into a :class:`~budget.Note` object and adds it to the :class:`~budget.notes.NoteManager` using
-        :class:`~pandas.Series.append` and optionally uses :class:`~pandas.Series.drop_duplicates`
+        """Parses a string into a note and adds it to the :class:`~budget.notes.NoteManager`, see :meth:`add_notes`
 
         Parameters
         ----------
@@ -157,10 +415,7 @@ class NoteManager:
 
         """
 
-        n = self.parse_note(id, note)
-        self.notes = self.notes.append([pd.Series([n], index=[n.id])])
-        if drop_dups:
-            self.drop_duplicates()
+        self.add_notes([id], note, drop_dups=drop_dups)
 
     def drop(self, id: str, note_text: str):
         """Drops a specific :class:`~budget.Note` using its ID and text
@@ -174,18 +429,55 @@ class NoteManager:
         """
 
         print(f'Dropping note from {id}: {note_text}')
-        self.notes = self.notes[~self.notes.apply(
-            lambda n: (n.note == note_text) and (n.id == id)
-        )]
+        self.keep(~((self.table['note'] == note_text) & (self.table['id'] == id)))
 
     def drop_duplicates(self):
         """Removes duplicate `Notes` in the :class:`~budget.notes.NoteManager`
         """
 
-        self.notes = self.notes[~self.notes.map(repr).duplicated()]
+        # the type of each note comes from its text, so notes with the same id and text are the same
+        self.keep(~self.table.duplicated(['id', 'note']).values)
+
+    def sql_frames(self):
+        """:attr:`table` and :attr:`splits` in the form they're saved to SQL, with the column types set so that the
+        tables get the right types even when they're empty
+        """
+        table = self.table.rename_axis('key').reset_index().astype({'key': np.int64})
+        splits = self.splits.astype({'key': np.int64, 'value': float})
+        return table, splits
+
+    def save_notes(self, con, incremental: bool = False):
+        """Saves :attr:`table` and :attr:`splits` to SQL, using the `key` of each note as the primary key.
 
-    def save_notes(self, con):
-        self.notes.map(repr).to_sql(name=self.SQL_NOTE_TABLE, con=con, if_exists='replace')
+        Incremental saves only insert, update and delete the notes that changed since they were last saved or loaded,
+        along with their split parts. Otherwise both tables are replaced
+
+        Parameters
+        ----------
+        con : SQLAlchemy connectable, :class:`str`, or :mod:`sqlite3` connection
+            SQL connection
+        incremental : bool
+            whether the notes were last saved to or loaded from the same database
+        """
+        table, splits = self.sql_frames()
+        current = fingerprints(table, 'key')
+        if (
+            not incremental or self._saved is None or
+            key_column(con, self.SQL_NOTE_TABLE) != 'key' or
+            table_columns(con, self.SQL_NOTE_TABLE) != table.columns.tolist() or
+            table_columns(con, self.SQL_SPLIT_TABLE) != splits.columns.tolist()
+        ):
+            create_table(con, self.SQL_NOTE_TABLE, table, key='key')
+            create_table(con, self.SQL_SPLIT_TABLE, splits, indexes=['key'])
+        else:
+            upserts, deletes = changed_keys(self._saved, current)
+            # split parts don't have a key of their own, so the parts of any note that changed are all written again
+            delete_rows(con, self.SQL_SPLIT_TABLE, 'key', upserts.append(deletes))
+            delete_rows(con, self.SQL_NOTE_TABLE, 'key', deletes)
+            upsert_rows(con, self.SQL_NOTE_TABLE, table[current.index.isin(upserts)], 'key')
+            insert_rows(con, self.SQL_SPLIT_TABLE, splits[splits['key'].isin(upserts).values])
+            self.logger.debug(f'Upserted {upserts.shape[0]} and deleted {deletes.shape[0]} notes')
+        self._saved = current
 
     def get_notes_by_id(self, ids: List[str]) -> pd.Series:
         """Gets the notes that match the IDs in the given list
@@ -200,7 +492,7 @@ class NoteManager:
         :class:`~pandas.Series`
         """
 
-        return self.notes[self.notes.apply(lambda n: n.id in ids)]
+        return self.note_objects(self.table['id'].isin(ids))
 
     def get_notes_by_type(self, typ: type) -> pd.Series:
         """Gets the notes that match the given type
@@ -215,8 +507,8 @@ class NoteManager:
         :class:`~pandas.Series`
         """
 
-        # doesn't use isinstance() to prevent subtypes from being selected
-        return self.notes[self.notes.apply(lambda n: type(n) is typ)]
+        # matches the type exactly to prevent subtypes from being selected
+        return self.note_objects(self.kind_mask(typ))
 
     def manual_ids(self, cat: str) -> np.ndarray:
         """Gets ids of transactions that have been manually categorized as the given category
@@ -231,44 +523,38 @@ class NoteManager:
         :class:`~numpy.ndarray`
         """
 
-        return self.notes[
-            # select from notes
-            self.notes.apply(
-                # the ones which are both a Category type and have a matching categorization
-                lambda n: isinstance(n, note.Category) and n.category == cat
-            )
-        ].apply(lambda n: n.id).values
+        return self.table['id'][self.kind_mask(Category) & (self.table['category'] == cat).values].values
 
     def split_ids(self, cat: str) -> pd.Series:
-        return self.notes[
-            # select from notes
-            self.notes.apply(
-                # the ones which are both a SplitNote type and have the category in one of its parts
-                lambda n: isinstance(n, split.SplitNote) and cat in n.parts
-            )
-        # convert to the value of the id attribute of each note
-        ].apply(lambda n: n.id)
+        # each SplitNote has at most one part for each category
+        ids = self.splits['id'][(self.splits['category'] == cat).values].values
+        return pd.Series(ids, index=ids, dtype='object')
+
+    def noted_ids(self) -> np.ndarray:
+        """Gets the ids of all the transactions that have notes attached or that are the target of a
+        :class:`~budget.notes.Link`. Rendering leaves every other transaction exactly as it is
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+        """
+        ids = np.concatenate([self.table['id'].values, self.table['target'].values[self.kind_mask(Link)]])
+        return pd.unique(ids[pd.notna(ids)])
 
     def linked_ids(self, df: pd.DataFrame) -> np.ndarray:
-        """Gets ids of transactions that target those in the given DataFrame
+        """Gets ids of transactions that are linked to those in the given DataFrame, directly or through a chain of links
 
         Example
-            Transactions A and B are both linked to transaction C, which appears in the given DataFrame
-            Returns a Series of ids that include the ids of A and B
+            Transaction A is linked to B, and B is linked to C, which appears in the given DataFrame
+            Returns an array of ids that include the ids of A and B
 
         Returns
         -------
         :class:`~numpy.ndarray`: str
         """
 
-        return self.notes[
-            # select from notes
-            self.notes.apply(
-                # the ones which are both a Link type and have a target id in the given DataFrame
-                lambda n: isinstance(n, note.Link) and n.target in df['id'].values
-            )
-        # convert to the value of the id attribute of each note
-        ].apply(lambda n: n.id).values
+        graph = self.link_graph
+        return graph.sources[graph.reaches(df['id'])]
 
     def apply_linked(self, df: pd.DataFrame) -> pd.DataFrame:
         """Applies Link notes in the given DataFrame, adding the value of each linked transaction onto the one it targets
@@ -276,6 +562,10 @@ class NoteManager:
         The DataFrame needs to include both the original transactions and the ones linked to them. The values of the linked
         transactions will be set to 0 as they are added onto the target transaction
 
+        Chains of links are followed with the :attr:`link_graph`, so each linked transaction is added onto the furthest
+        transaction along its chain that's in the DataFrame. Targets with several sources get them added in the order
+        of the notes
+
         Parameters
         ----------
         df : :class:`~pandas.DataFrame`
@@ -284,52 +574,74 @@ class NoteManager:
         Returns
         -------
         :class:`~pandas.DataFrame`
-            :class:`~pandas.DataFrame` of the modified transactions
+            :class:`~pandas.DataFrame` of the modified transactions, with the ``id`` column first
         """
 
-        link_notes = self.get_notes_by_type(note.Link)
-        source_in_df = link_notes.apply(lambda n: n.id in df['id'].values)
-        target_in_df = link_notes.apply(lambda n: n.target in df['id'].values)
-        # assert (target_in_df & ~source_in_df).any()
+        graph = self.link_graph
+        source = row_positions(df['id'], graph.sources)
+        destination = graph.destinations(df['id'])
+        orig = df['Amount'].to_numpy(dtype=float)
+        amounts = orig.copy()
 
-        df = df.reset_index().set_index('id')
+        # if both the source and somewhere along its chain exist in the DataFrame, add the source Amount there
+        both = (source >= 0) & (destination >= 0)
+        source, destination = source[both], destination[both]
+        for rnd in occurrence_rounds(destination):
+            amounts[destination[rnd]] += orig[source[rnd]]
 
-        try:
-            # if both source and target exist in the DataFrame, add the source Amount to the target Amount
-            for n in link_notes[source_in_df & target_in_df]:
-                df.loc[n.target, 'Amount'] += df.loc[n.id, 'Amount']
-            # set the values of all source transactions to 0
-            for n in link_notes[source_in_df]:
-                df.loc[n.id, 'Amount'] = 0
-        except Exception as e:
-            raise
-
-        df = df.reset_index().set_index(df.columns[0])
-        return df
+        # set the values of all source transactions to 0
+        amounts[df['id'].isin(graph.sources).values] = 0
+        return with_amounts(df, amounts)
 
     def apply_split(self, df: pd.DataFrame, cat: str) -> pd.DataFrame:
-        split_notes = self.get_notes_by_type(split.SplitNote)
-        for_this_cat = split_notes.apply(lambda n: cat in n.parts)
-        trans_in_df = split_notes.apply(lambda n: n.id in df['id'].values)
+        """Applies SplitNotes in the given DataFrame. Transactions split into the given category keep the part for the
+        category, and the rest have the parts for the other categories taken out
 
-        df = df.reset_index().set_index('id')
+        Split parts are applied as array operations on the amounts using :attr:`splits`. Transactions with more than
+        one SplitNote get them applied over several rounds, in the same order as applying every note one at a time
+
+        Parameters
+        ----------
+        df : :class:`~pandas.DataFrame`
+            transactions to apply the split notes to
+        cat : :class:`str`
+            category being rendered
+
+        Returns
+        -------
+        :class:`~pandas.DataFrame`
+            :class:`~pandas.DataFrame` of the modified transactions, with the ``id`` column first
+        """
+
+        parts = self.splits.assign(pos=row_positions(df['id'], self.splits['id']))
+        parts = parts[parts['pos'].values >= 0]
+        parts['for_cat'] = (parts['category'].isna() if cat is None else parts['category'] == cat).values
+        # amount splits replace the value, the others scale it
+        parts['scale'] = parts['kind'].values != SplitAmount.__name__
+
+        # within each transaction, the notes for this category are applied first, and then the rest
+        notes = parts.groupby('key', sort=True).agg(pos=('pos', 'first'), for_cat=('for_cat', 'any'))
+        notes = notes.sort_values('for_cat', ascending=False, kind='mergesort')
+        parts = parts.join(notes['for_cat'].rename('note_for_cat'), on='key')
+        amounts = df['Amount'].to_numpy(dtype=float, copy=True)
+
+        for rnd in occurrence_rounds(notes['pos'].values):
+            keys = notes.index[rnd]
+            orig = amounts.copy()
+            in_round = parts[parts['key'].isin(keys).values]
 
-        try:
             # If the split is for this category, set the Amount equal to the modified value
-            for n in split_notes[trans_in_df & for_this_cat]:
-                orig_val = df.loc[n.id, 'Amount']
-                df.loc[n.id, 'Amount'] = n.parts[cat].modify(orig_val)
-            # If the split is not for this category, then subtract all the other modified values
-            for n in split_notes[trans_in_df & ~for_this_cat]:
-                orig_val = df.loc[n.id, 'Amount']
-                for target_cat, split_obj in n.parts.items():
-                    df.loc[n.id, 'Amount'] -= split_obj.modify(orig_val)
+            mine = in_round[in_round['note_for_cat'].values & in_round['for_cat'].values]
+            pos = mine['pos'].values
+            amounts[pos] = np.where(mine['scale'].values, orig[pos] * mine['value'].values, mine['value'].values)
 
-        except Exception as e:
-            raise
+            # If the split is not for this category, then subtract all the other modified values
+            others = in_round[~in_round['note_for_cat'].values]
+            for part in occurrence_rounds(others['key'].values):
+                pos, value = others['pos'].values[part], others['value'].values[part].astype(float)
+                amounts[pos] -= np.where(others['scale'].values[part], orig[pos] * value, value)
 
-        df = df.reset_index().set_index(df.columns[0])
-        return df
+        return with_amounts(df, amounts)
 
     def apply_notes(self, df: pd.DataFrame, cat: str) -> pd.DataFrame:
         df = self.apply_linked(df)
@@ -337,26 +649,85 @@ class NoteManager:
         return df
 
     def re_parse(self):
-        self.notes = self.notes.map(lambda n: self.parse_note(n.id, n.note))
+        self.notes = pd.Series([self.parse_note(id, text) for id, text in zip(self.table['id'], self.table['note'])])
 
     @property
     def note_text(self) -> pd.Series:
-        res = self.notes.apply(lambda n: n.note)
-        res.name = 'note text'
-        return res
+        return pd.Series(self.table['note'].values, index=self.table['id'].values, name='note text', dtype='object')
+
+    def sync_search_index(self) -> bool:
+        """Mirrors the text of the notes into an in-memory SQLite FTS5 table using the trigram tokenizer, which
+        answers case-insensitive substring searches. The table is created the first time it's needed, and after that
+        only the notes that were added or dropped since the last search are written to it
+
+        Returns
+        -------
+        bool
+            ``False`` if this version of SQLite doesn't have FTS5 or the trigram tokenizer
+        """
+        if self._fts is None:
+            try:
+                self._fts = sqlite3.connect(':memory:', check_same_thread=False)
+                self._fts.execute(f"create virtual table {self.SQL_FTS_TABLE} using fts5(note, tokenize='trigram')")
+            except sqlite3.OperationalError:
+                LOGGER.debug('SQLite FTS5 trigram tokenizer not available, note searches will scan every note')
+                self._fts = False
+        if self._fts is False:
+            return False
+
+        # keys are never reused, so comparing them is enough to find the notes that changed
+        keys = self.table.index.values.astype(np.int64)
+        dropped = np.setdiff1d(self._fts_keys, keys, assume_unique=True)
+        added = ~np.isin(keys, self._fts_keys, assume_unique=True)
+        with self._fts:
+            self._fts.executemany(f'delete from {self.SQL_FTS_TABLE} where rowid = ?', ((int(k),) for k in dropped))
+            self._fts.executemany(
+                f'insert into {self.SQL_FTS_TABLE}(rowid, note) values (?, ?)',
+                zip(keys[added].tolist(), self.table['note'].values[added])
+            )
+        self._fts_keys = keys
+        return True
+
+    def search_mask(self, input: str, case: bool = False) -> np.ndarray:
+        """Finds the notes whose text matches a regex, like :meth:`~pandas.Series.str.contains`.
+
+        Queries that are plain ASCII text of at least 3 characters get their candidates from the full-text index
+        (see :meth:`sync_search_index`) and only those are checked with the regex. Anything else scans every note
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+            :class:`bool` mask of the rows in :attr:`table`
+        """
+        literal = literal_text(input) if isinstance(input, str) else None
+        if literal is None or len(literal) < 3 or not literal.isascii() or not self.sync_search_index():
+            return self.table['note'].str.contains(input, case=case).values.astype(bool)
+
+        phrase = '"' + literal.replace('"', '""') + '"'
+        keys = [row[0] for row in self._fts.execute(
+            f'select rowid from {self.SQL_FTS_TABLE} where {self.SQL_FTS_TABLE} match ?', (phrase,)
+        )]
+        candidates = np.flatnonzero(self.table.index.isin(keys))
+
+        # the index ignores case, so the candidates are checked against the actual query
+        rgx = re.compile(input, 0 if case else re.IGNORECASE)
+        mask = np.zeros(self.table.shape[0], dtype=bool)
+        mask[candidates] = [rgx.search(t) is not None for t in self.table['note'].values[candidates]]
+        return mask
 
     def contains(self, input: str, case: bool = False, text: bool = False) -> pd.Series:
-        res = self.notes[self.note_text.str.contains(input, case=case)]
+        mask = self.search_mask(input, case)
         if text:
-            res = res.apply(lambda n: n.note)
-        return res
+            return self.note_text[mask]
+        return self.note_objects(mask)
 
     @property
     def tagged_categories(self) -> pd.Series:
         # returns a Series of the unique categories in Category notes
-        return self.get_notes_by_type(Category).apply(lambda n: n.category).drop_duplicates()
+        mask = self.kind_mask(Category)
+        return pd.Series(self.table['category'].values[mask], index=self.table['id'].values[mask]).drop_duplicates()
 
     def drop_orphans(self, ids):
-        orphans = self.notes[~self.notes.index.isin(ids)]
-        self.notes = self.notes.drop(orphans.index)
-        LOGGER.debug(f'Dropped {orphans.shape[0]} orphaned messages')
+        orphaned = ~self.table['id'].isin(ids).values
+        self.keep(~orphaned)
+        LOGGER.debug(f'Dropped {orphaned.sum()} orphaned messages')
@@ -8,26 +8,35 @@ import matplotlib.dates as dates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import yaml
 
 from . import utils
 from .expense import Expense
 from ..data import BudgetData
+from ..load import load_config
+from ..utils import date_bounds
 
 logger = logging.getLogger(__name__)
 
 
 class BudgetPlan:
-    def __init__(self, yaml_path: str):
+    def __init__(self, yaml_path: str, start: str = None):
+        """
+        Parameters
+        ----------
+        yaml_path : str
+            path to the yaml configuration file
+        start : str or datetime
+            earliest date to load from the database. Older transactions are paged in when a report asks for them, see
+            :meth:`~budget.BudgetData.load_history`
+        """
         self.yaml_path = Path(yaml_path)
         self.data: BudgetData = BudgetData(yaml_path)
         if self.data.db_path.exists():
-            self.data.load_sql()
+            self.data.load_sql(start=start)
 
     @property
     def cfg(self):
-        with self.yaml_path.open('r') as file:
-            return yaml.load(file, Loader=yaml.SafeLoader)
+        return load_config(self.yaml_path)
 
     @property
     def daily(self):
@@ -43,7 +52,9 @@ class BudgetPlan:
         return round(self.daily * 31, 2)
 
     def category_report(self, name: str, start_date: datetime = None) -> pd.DataFrame:
-        df = self.data[name][start_date or datetime.today().strftime('%Y'):]
+        start_date = start_date or datetime.today().strftime('%Y')
+        self.data.load_history(start_date)
+        df = self.data[name][start_date:]
         return utils.compare(df, self.get_expense(name).daily)
 
     def get_expense(self, name: str) -> Expense:
@@ -53,12 +64,11 @@ class BudgetPlan:
             raise KeyError(f'{name} has nothing planned for it')
 
     def category_plot(self, cat: str, start_date: str = None, end_date: str = None, extend=False, **kwargs) -> plt.Figure:
-        df = self.data[cat]
-
         this_year = datetime.today().strftime('%Y')
         start_date = start_date or this_year
         end_date = end_date or this_year
-        df = df[start_date:end_date]
+        self.data.load_history(*date_bounds(slice(start_date, end_date)))
+        df = self.data[cat][start_date:end_date]
 
         daily = self.get_expense(cat).daily
         if extend:
@@ -70,8 +80,9 @@ class BudgetPlan:
         return fig, df
 
     def current(self, cat: str, start_date: str = None) -> float:
-        df = self.data[cat]
-        df = df[start_date or datetime.today().strftime('%Y'):]
+        start_date = start_date or datetime.today().strftime('%Y')
+        self.data.load_history(start_date)
+        df = self.data[cat][start_date:]
 
         total = df['Amount'].sum()
         todays_date = datetime.combine(datetime.today(), datetime.min.time())
@@ -93,7 +104,9 @@ class BudgetPlan:
         return datetime.now() - timedelta(days=self.days(cat, start_date, add))
 
     def since_last_zero(self, cat:str, start_date: datetime = None) -> pd.DataFrame:
-        df = self.data[cat][start_date or datetime.today().strftime('%Y'):]
+        start_date = start_date or datetime.today().strftime('%Y')
+        self.data.load_history(start_date)
+        df = self.data[cat][start_date:]
         daily = self.get_expense(cat).daily
         df = utils.prepare_plot_data(
             df=df,
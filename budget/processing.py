@@ -1,14 +1,21 @@
+import re
 from typing import Dict, Union, List
 
 import numpy as np
 import pandas as pd
 
 from . import utils
+from .selections import SelectionMatrix
+
+BACKREF_REGEX = re.compile(r'\\\d|\(\?P=')
 
 
 def flatten_mask_tree(mask_tree: Dict[str, Union[Dict, str]]) -> Dict[str, pd.Series]:
-    """Walks through the mask_tree using :func:`~budget.utils.recursive_items` and builds a resultant dictionary by summarizing the portion
-    of the tree below each node using :func:`~budget.utils.summarize`
+    """Walks through the mask_tree once and builds a resultant dictionary with the mask of every node, which is the
+    logical ``OR`` of the portion of the tree below it.
+
+    Masks are combined bottom-up, so each parent is built from the already combined masks of its children instead of
+    walking its whole subtree again. Keys are in the same order as :func:`~budget.utils.recursive_items` visits them
 
     Essentially used to pre-process the tree so that any key can be used to immediately retrieve the correct selection
     mask
@@ -24,12 +31,38 @@ def flatten_mask_tree(mask_tree: Dict[str, Union[Dict, str]]) -> Dict[str, pd.Se
         flattened :class:`dict` of :class:`~pandas.Series` with :class:`bool` `dtype`
     """
 
-    return {key: summarize(value) for key, value in utils.recursive_items(mask_tree)}
-
-
-def gen_mask_tree(df: pd.DataFrame, cats: Dict[str, Union[Dict, str]]) -> Dict[str, Union[Dict, str]]:
-    """Walks through the nested dictionary of categories, using :func:`~budget.utils.apply_func`
-    and calls :func:`~budget.processing.proc_query` on all the leaves.
+    ref = utils.first_item(mask_tree)
+    # entries are reserved before the children are combined so the keys keep their top-down order
+    entries = []
+
+    def combine(node) -> np.ndarray:
+        if isinstance(node, dict):
+            children = []
+            for key, value in node.items():
+                i = len(entries)
+                entries.append(None)
+                mask = combine(value)
+                entries[i] = (key, mask)
+                children.append(mask)
+        elif isinstance(node, list):
+            children = [combine(item) for item in node]
+        else:
+            return np.array(node, dtype=bool)
+
+        res = np.zeros(len(ref.index), dtype=bool)
+        for mask in children:
+            res |= mask
+        return res
+
+    combine(mask_tree)
+    return {key: pd.Series(mask, index=ref.index) for key, mask in entries}
+
+
+def gen_mask_tree(df: pd.DataFrame, cats: Dict[str, Union[Dict, str]], codes: np.ndarray = None) -> Dict[str, Union[Dict, str]]:
+    """Walks through the nested dictionary of categories, using :func:`~budget.utils.apply_func`, and builds a mask for
+    each of the leaves from the results of :func:`~budget.processing.match_queries`.
+
+    Each transaction only ends up in the mask of the first leaf that it matches
 
     Parameters
     ----------
@@ -37,6 +70,8 @@ def gen_mask_tree(df: pd.DataFrame, cats: Dict[str, Union[Dict, str]]) -> Dict[s
             :class:`~pandas.DataFrame` of transaction history
         cats : :class:`dict`
             nested :class:`dict` of categories (queries) to match the transaction history against
+        codes : :class:`~numpy.ndarray`
+            index of the first leaf each transaction matches, if it's already known
 
     Returns
     -------
@@ -45,15 +80,152 @@ def gen_mask_tree(df: pd.DataFrame, cats: Dict[str, Union[Dict, str]]) -> Dict[s
 
     """
 
-    # keeps track of what's already been matched with already_matched_mask
-    already_matched_mask = pd.Series(np.full(df.shape[0], False), index=df.index).astype(bool)
-    def match_transactions(query):
-        nonlocal already_matched_mask
-        raw_match_mask = proc_query(df, query)
-        matches = raw_match_mask & (~already_matched_mask)
-        already_matched_mask |= matches
-        return matches
-    return utils.apply_func(cats, match_transactions)
+    if codes is None:
+        codes = match_queries(df.filter(regex='(?i).*desc').iloc[:, 0], leaf_queries(cats))
+
+    # apply_func visits the leaves in the same order as leaf_queries
+    leaf = -1
+    def leaf_mask(query):
+        nonlocal leaf
+        leaf += 1
+        return pd.Series(codes == leaf, index=df.index)
+    return utils.apply_func(cats, leaf_mask)
+
+
+def leaf_patterns(cats: Dict[str, Union[Dict, str]]) -> pd.DataFrame:
+    """Works out which of the flattened categories each leaf belongs to, by running
+    :func:`~budget.processing.gen_mask_tree` and :func:`~budget.processing.flatten_mask_tree` over the leaves themselves
+    instead of over transactions
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        :class:`bool` row for each leaf, in the order of :func:`~budget.processing.leaf_queries`, plus a final row of
+        ``False`` for transactions that don't match any leaf
+    """
+    n = len(leaf_queries(cats))
+    index = pd.RangeIndex(n + 1)
+    codes = np.append(np.arange(n), -1)
+    return pd.DataFrame(flatten_mask_tree(gen_mask_tree(pd.DataFrame(index=index), cats, codes=codes)), index=index)
+
+
+def leaf_queries(cats: Dict[str, Union[Dict, str]]) -> List[Union[str, List[str]]]:
+    """Collects the leaves of the nested dictionary of categories in the order they're visited by
+    :func:`~budget.utils.apply_func`, which is the order of precedence for matching transactions
+    """
+    queries = []
+    utils.apply_func(cats, queries.append)
+    return queries
+
+
+def compile_queries(queries: List[Union[str, List[str]]]) -> re.Pattern:
+    """Combines queries into a single case-insensitive regex. Each query becomes a lookahead that searches the whole
+    description, followed by an empty named group ``q<index>``.
+
+    Alternatives are tried in order, so using :meth:`re.Pattern.match` on a description stops at the first query that
+    matches and :attr:`re.Match.lastgroup` identifies it
+
+    Parameters
+    ----------
+    queries : list
+        queries in the same form as :func:`~budget.processing.proc_query` takes
+
+    Returns
+    -------
+    :class:`re.Pattern`
+    """
+    parts = []
+    for i, query in enumerate(queries):
+        if isinstance(query, list):
+            query = ''.join(['(?=.*{})'.format(q) for q in query])
+        if BACKREF_REGEX.search(query):
+            # group numbers shift once the queries are combined
+            raise re.error(f'backreferences can\'t be combined: {query}')
+        parts.append(f'(?=(?s:.*?)(?:{query}))(?P<q{i}>)')
+    return re.compile('|'.join(parts), re.IGNORECASE)
+
+
+def match_queries(desc: pd.Series, queries: List[Union[str, List[str]]]) -> np.ndarray:
+    """Finds the first query that each description matches.
+
+    Every distinct description is scanned once with the regex from :func:`~budget.processing.compile_queries`. If the
+    queries can't be combined, each one is run with :func:`~budget.processing.proc_query` instead
+
+    Parameters
+    ----------
+    desc : :class:`~pandas.Series`
+        transaction descriptions
+    queries : list
+        queries in the same form as :func:`~budget.processing.proc_query` takes
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        index of the first matching query for each description, ``-1`` where nothing matches
+    """
+    try:
+        match = compile_queries(queries).match if queries else None
+    except re.error:
+        codes = np.full(desc.shape[0], -1)
+        df = desc.rename('Description').to_frame()
+        for i, query in enumerate(queries):
+            codes[(codes == -1) & (proc_query(df, query) == True).values] = i
+        return codes
+
+    uniques_codes, uniques = pd.factorize(desc)
+    res = np.full(uniques.shape[0] + 1, -1)
+    if match is not None:
+        for i, d in enumerate(uniques):
+            if isinstance(d, str):
+                m = match(d)
+                if m is not None:
+                    res[i] = int(m.lastgroup[1:])
+    # factorize uses -1 for missing values, which picks up the -1 at the end
+    return res[uniques_codes]
+
+
+def update_matches(desc: pd.Series,
+                   queries: List[Union[str, List[str]]],
+                   old_queries: List[Union[str, List[str]]],
+                   old_codes: np.ndarray) -> np.ndarray:
+    """Updates the results of :func:`~budget.processing.match_queries` after the queries have been edited.
+
+    Leaves before the first changed query keep their precedence, so transactions that matched one of them still match
+    it. Only the transactions that matched a later leaf or nothing at all are scanned again, and only against the
+    queries from the first change onwards
+
+    Parameters
+    ----------
+    desc : :class:`~pandas.Series`
+        transaction descriptions
+    queries : list
+        the new queries
+    old_queries : list
+        the queries `old_codes` were matched against
+    old_codes : :class:`~numpy.ndarray`
+        previous results for each description, with ``-2`` for descriptions that haven't been matched before
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        index of the first matching query for each description, ``-1`` where nothing matches
+    """
+    first_change = 0
+    for new, old in zip(queries, old_queries):
+        if new != old:
+            break
+        first_change += 1
+
+    codes = np.array(old_codes, dtype=int)
+    unknown = codes == -2
+    affected = ~unknown & ((codes >= first_change) | (codes == -1))
+
+    if unknown.any():
+        codes[unknown] = match_queries(desc[unknown], queries)
+    if affected.any():
+        res = match_queries(desc[affected], queries[first_change:])
+        codes[affected] = np.where(res >= 0, res + first_change, -1)
+    return codes
 
 
 def proc_query(df: pd.DataFrame, query: Union[str, List[str]]) -> pd.Series:
@@ -107,6 +279,38 @@ def summarize(mask_tree: Dict[str, Union[Dict, pd.Series]]) -> pd.Series:
     return sel
 
 
+def last_match(sel: pd.DataFrame) -> pd.Series:
+    """Finds the name of the last column that is ``True`` in each row of a selection :class:`~pandas.DataFrame`, which
+    is the most specific category that matched, because :func:`~budget.processing.flatten_mask_tree` lists child
+    categories after their parents
+
+    The position of the last ``True`` comes from :func:`~numpy.argmax` over the reversed boolean matrix, so the whole
+    thing is done in one operation instead of row by row
+
+    Parameters
+    ----------
+    sel : :class:`~pandas.DataFrame` or :class:`~budget.selections.SelectionMatrix`
+        :class:`~pandas.DataFrame` with :class:`bool` `dtype`, one column per category
+
+    Returns
+    -------
+    :class:`~pandas.Series`
+        :class:`~pandas.Categorical` of the category name for each row, missing for rows that didn't match any category
+    """
+
+    if isinstance(sel, SelectionMatrix):
+        # only the distinct patterns need to be looked at
+        return pd.Series(last_match(pd.DataFrame(sel.patterns, columns=sel.columns)).values[sel.codes], index=sel.index)
+
+    values = sel.to_numpy(dtype=bool)
+    if values.shape[1] == 0:
+        codes = np.full(values.shape[0], -1)
+    else:
+        codes = values.shape[1] - 1 - np.argmax(values[:, ::-1], axis=1)
+        codes[~values.any(axis=1)] = -1
+    return pd.Series(pd.Categorical.from_codes(codes, categories=sel.columns), index=sel.index)
+
+
 def sum_duplicates(df: pd.DataFrame) -> pd.DataFrame:
     """Combine duplicate rows in the DataFrame by summing numeric columns. Values are set using
     :meth:`~pandas.DataFrame.loc` with the indices of duplicates, which are found using
@@ -0,0 +1,120 @@
+import logging
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# a cube has one row per date and category, with the total ``Amount`` and the number ``n`` of transactions
+KEYS = ['Date', 'category']
+# amounts in a cube are whole numbers of 1/UNITS, which add up to the same total in any order
+UNITS = 10 ** 8
+# same conversion in SQL, since SQLite's round() also adds or subtracts 0.5 and truncates
+SQL_UNITS = f'cast(round({{}} * {UNITS}) as integer)'
+
+
+def to_units(amounts) -> np.ndarray:
+    """Converts amounts to :class:`int` numbers of 1/:data:`UNITS`, rounding halves away from zero the same way as
+    :data:`SQL_UNITS`. Missing amounts count as ``0``
+    """
+    values = np.nan_to_num(np.asarray(amounts, dtype=float)) * UNITS
+    return np.trunc(values + np.copysign(0.5, values)).astype(np.int64)
+
+
+def from_units(units) -> np.ndarray:
+    return np.asarray(units, dtype=np.int64) / UNITS
+
+
+def empty_cube() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Date': pd.DatetimeIndex([]),
+        'category': pd.Series([], dtype='object'),
+        'Amount': pd.Series([], dtype='int64'),
+        'n': pd.Series([], dtype='int64')
+    })
+
+
+def code_totals(dates, codes, amounts) -> pd.DataFrame:
+    """Totals the amounts and counts the transactions by date and selection pattern code
+
+    Parameters
+    ----------
+    dates : :class:`~pandas.DatetimeIndex`
+        date of each transaction
+    codes : :class:`~numpy.ndarray`
+        pattern code of each transaction, see :class:`~budget.selections.SelectionMatrix`
+    amounts : :class:`~pandas.Series`
+        amount of each transaction
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        ``Date``, ``code``, ``Amount`` in :data:`UNITS` and ``n`` columns
+    """
+    df = pd.DataFrame({'Date': np.asarray(dates), 'code': np.asarray(codes), 'Amount': to_units(amounts)})
+    return df.groupby(['Date', 'code'], sort=False)['Amount'].agg(Amount='sum', n='size').reset_index()
+
+
+def by_category(totals: pd.DataFrame, patterns: pd.DataFrame) -> pd.DataFrame:
+    """Spreads the totals of each pattern code onto every category that the pattern includes
+
+    Parameters
+    ----------
+    totals : :class:`~pandas.DataFrame`
+        totals by date and pattern code, see :func:`code_totals`
+    patterns : :class:`~pandas.DataFrame`
+        :class:`bool` categories included in each pattern, indexed by code
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        cube of the totals by date and category
+    """
+    codes, cats = np.nonzero(patterns.to_numpy(dtype=bool))
+    members = pd.DataFrame({'code': patterns.index.values[codes], 'category': patterns.columns.values[cats]})
+    return add(totals.merge(members, on='code'))
+
+
+def add(*cubes: pd.DataFrame) -> pd.DataFrame:
+    """Adds cubes together, lining them up by date and category
+    """
+    res = pd.concat(cubes, ignore_index=True) if len(cubes) > 1 else cubes[0]
+    res = res.astype({'category': 'object', 'Amount': 'int64', 'n': 'int64'})
+    return res.groupby(KEYS, sort=False)[['Amount', 'n']].sum().reset_index()
+
+
+def negate(cube: pd.DataFrame) -> pd.DataFrame:
+    return cube.assign(Amount=-cube['Amount'], n=-cube['n'])
+
+
+def nonzero(cube: pd.DataFrame) -> pd.DataFrame:
+    """Drops the rows that don't change anything when the cube is added to another one
+    """
+    return cube[(cube['Amount'] != 0).values | (cube['n'] != 0).values]
+
+
+def pivot(cube: pd.DataFrame, categories: List[str]) -> pd.DataFrame:
+    """Lays out the totals of some categories side by side, the same way as
+    :meth:`~budget.BudgetData.category_totals`
+
+    Parameters
+    ----------
+    cube : :class:`~pandas.DataFrame`
+        totals by date and category
+    categories : list of str
+        categories to use as the columns, which can be repeated
+
+    Returns
+    -------
+    :class:`~pandas.DataFrame`
+        total amount for each date that any of the categories has transactions on, ``0`` where a category doesn't
+    """
+    cube = cube[cube['category'].isin(categories).values & (cube['n'] > 0).values]
+    cube = cube.assign(Amount=from_units(cube['Amount'].values))
+    res = cube.pivot(index='Date', columns='category', values='Amount').sort_index()
+    res = res.reindex(columns=pd.unique(np.asarray(categories, dtype=object))).fillna(0)
+    # positions handle categories that are asked for more than once
+    res = res.iloc[:, res.columns.get_indexer(categories)]
+    res.columns = pd.Index(categories)
+    return res
@@ -0,0 +1,243 @@
+import logging
+import re
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    # before python 3.11
+    import sre_constants
+    import sre_parse
+
+LOGGER = logging.getLogger(__name__)
+
+# python 3.11 added possessive repeats and atomic groups
+REPEATS = [sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT] + \
+          ([sre_constants.POSSESSIVE_REPEAT] if hasattr(sre_constants, 'POSSESSIVE_REPEAT') else [])
+ATOMIC_GROUPS = [sre_constants.ATOMIC_GROUP] if hasattr(sre_constants, 'ATOMIC_GROUP') else []
+
+
+def literal_text(pattern: str) -> Optional[str]:
+    """Gets the text that a regex matches when it's made of nothing but literal characters
+
+    Returns
+    -------
+    :class:`str` or ``None``
+        text of the pattern, with any escapes resolved, or ``None`` if the pattern has anything besides literals
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return
+    if all(op == sre_constants.LITERAL for op, av in parsed):
+        return ''.join(chr(av) for op, av in parsed)
+
+
+class TrigramIndex:
+    """Inverted index from every 3 character sequence (trigram) to the descriptions that contain it
+
+    Most regex queries contain literal text that any match has to include, so only the descriptions containing all of
+    its trigrams need to be scanned with the regex. Queries without any usable literals fall back to scanning every
+    description. Either way, each distinct description is only scanned once, no matter how many transactions share it.
+
+    Descriptions are indexed in lower case, so the candidates work for both case sensitive and insensitive queries.
+    Descriptions with any non-ASCII characters aren't indexed and are always scanned, because the case-insensitive
+    matching in :mod:`re` lets some of those characters match ASCII letters
+
+    Attributes
+    ----------
+    codes : :class:`~numpy.ndarray`
+        position of each value in :attr:`uniques`
+    uniques : :class:`~numpy.ndarray`
+        distinct values that were indexed
+    trigrams : :class:`~numpy.ndarray`
+        sorted :class:`int` trigram codes
+    offsets : :class:`~numpy.ndarray`
+        start of the postings of each trigram, with the end of the postings as the last element
+    postings : :class:`~numpy.ndarray`
+        positions in :attr:`uniques` for each trigram, sorted within each trigram
+    unindexed : :class:`~numpy.ndarray`
+        positions in :attr:`uniques` that are always scanned
+    """
+
+    def __init__(self, values: pd.Series, chunk_size: int = 50_000):
+        """Builds the index over a :class:`~pandas.Series` of :class:`str`
+
+        Parameters
+        ----------
+        values : :class:`~pandas.Series`
+            values to index, usually the descriptions of the transactions. Missing values never match
+        chunk_size : :class:`int`
+            number of distinct values to process at once, which limits the memory used while building the index
+        """
+        self.index = values.index
+        self.name = values.name
+        self.codes, self.uniques = pd.factorize(values.values)
+        self.uniques = np.asarray(self.uniques, dtype=object)
+
+        lowered = [v.lower() if isinstance(v, str) and v.isascii() and '\x00' not in v else None for v in self.uniques]
+        self.unindexed = np.array([i for i, v in enumerate(lowered) if v is None], dtype=np.int64)
+
+        keys = []
+        for start in range(0, len(lowered), chunk_size):
+            keys.append(self.trigram_keys(lowered[start:start + chunk_size], start))
+        keys = np.unique(np.concatenate(keys)) if keys else np.array([], dtype=np.int64)
+
+        # keys sort by trigram first and then by position, so the postings of each trigram are contiguous and sorted
+        n = max(len(self.uniques), 1)
+        self.trigrams, starts = np.unique(keys // n, return_index=True)
+        self.offsets = np.append(starts, keys.shape[0])
+        self.postings = keys % n
+        LOGGER.debug(f'Indexed {len(self.uniques)} distinct values with {self.trigrams.shape[0]} trigrams')
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def trigram_keys(self, lowered: List[Optional[str]], start: int) -> np.ndarray:
+        """Makes a combined ``trigram * number of uniques + position`` key for every trigram of every value
+
+        Parameters
+        ----------
+        lowered : list of str
+            lower case ASCII values, ``None`` for values that aren't indexed
+        start : :class:`int`
+            position of the first value in :attr:`uniques`
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+        """
+        chars = np.array([v or '' for v in lowered], dtype=bytes)
+        if chars.itemsize < 3:
+            return np.array([], dtype=np.int64)
+
+        # fixed width byte strings are padded with zeros, so windows containing a zero are past the end of the value
+        chars = chars.view(np.uint8).reshape(len(lowered), -1).astype(np.int32)
+        codes = (chars[:, :-2] << 16) | (chars[:, 1:-1] << 8) | chars[:, 2:]
+        valid = (chars[:, 2:] != 0)
+        positions = np.broadcast_to(np.arange(start, start + len(lowered))[:, None], codes.shape)
+        return np.unique(codes[valid].astype(np.int64) * max(len(self.uniques), 1) + positions[valid])
+
+    def lookup(self, literal: str) -> Optional[np.ndarray]:
+        """Finds the indexed values that contain all the trigrams of a literal string
+
+        Returns
+        -------
+        :class:`~numpy.ndarray` or ``None``
+            positions in :attr:`uniques`, or ``None`` if the literal is too short to narrow anything down
+        """
+        literal = literal.lower()
+        if len(literal) < 3:
+            return
+
+        grams = np.unique([
+            (ord(a) << 16) | (ord(b) << 8) | ord(c)
+            for a, b, c in zip(literal, literal[1:], literal[2:])
+        ])
+        pos = np.searchsorted(self.trigrams, grams)
+        if (pos == self.trigrams.shape[0]).any() or (self.trigrams[pos] != grams).any():
+            # at least one of the trigrams isn't anywhere in the values
+            return np.array([], dtype=np.int64)
+
+        # intersecting the shortest postings first keeps the intermediate results small
+        postings = sorted((self.postings[self.offsets[p]:self.offsets[p + 1]] for p in pos), key=len)
+        res = postings[0]
+        for p in postings[1:]:
+            res = np.intersect1d(res, p, assume_unique=True)
+        return res
+
+    def candidates(self, pattern: Union[str, re.Pattern]) -> Optional[np.ndarray]:
+        """Narrows down which indexed values can match a regex, based on the literal text that every match contains
+
+        Returns
+        -------
+        :class:`~numpy.ndarray` or ``None``
+            positions in :attr:`uniques`, or ``None`` if every value needs to be scanned
+        """
+        if isinstance(pattern, re.Pattern):
+            pattern, flags = pattern.pattern, pattern.flags
+        else:
+            flags = 0
+
+        if not isinstance(pattern, str):
+            return
+        try:
+            parsed = sre_parse.parse(pattern, flags)
+        except Exception:
+            return
+        return self.required(parsed)
+
+    def required(self, items) -> Optional[np.ndarray]:
+        """Walks through a parsed regex and intersects the candidates of everything a match has to contain
+
+        Parameters
+        ----------
+        items : sequence of ``(opcode, argument)``
+            parsed regex from :mod:`re`
+
+        Returns
+        -------
+        :class:`~numpy.ndarray` or ``None``
+            positions in :attr:`uniques`, or ``None`` if every value needs to be scanned
+        """
+        res = None
+        parts = []
+        run = ''
+        for op, av in list(items) + [(None, None)]:
+            if op == sre_constants.LITERAL and chr(av).isascii() and av != 0:
+                run += chr(av)
+                continue
+
+            parts.append(self.lookup(run))
+            run = ''
+            if op == sre_constants.SUBPATTERN:
+                parts.append(self.required(av[-1]))
+            elif op in REPEATS and av[0] >= 1:
+                parts.append(self.required(av[2]))
+            elif op == sre_constants.ASSERT and av[0] == 1:
+                # the contents of a lookahead still have to be somewhere in the value
+                parts.append(self.required(av[1]))
+            elif op in ATOMIC_GROUPS:
+                parts.append(self.required(av))
+            elif op == sre_constants.BRANCH:
+                branches = [self.required(branch) for branch in av[1]]
+                if all(b is not None for b in branches):
+                    parts.append(np.unique(np.concatenate(branches)))
+
+        for part in parts:
+            if part is not None:
+                res = part if res is None else np.intersect1d(res, part, assume_unique=True)
+        return res
+
+    def search(self, pattern: Union[str, re.Pattern], case: bool = True) -> pd.Series:
+        """Equivalent of :meth:`pandas.Series.str.contains` for the indexed values, except that missing values are
+        ``False``
+
+        Parameters
+        ----------
+        pattern : :class:`str` or :class:`re.Pattern`
+            regex to search for
+        case : :class:`bool`
+            ``False`` to make a :class:`str` pattern case insensitive
+
+        Returns
+        -------
+        :class:`~pandas.Series`
+            :class:`bool` mask for the indexed values
+        """
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern, 0 if case else re.IGNORECASE)
+
+        candidates = self.candidates(pattern)
+        if candidates is None:
+            candidates = np.arange(len(self.uniques))
+        else:
+            candidates = np.union1d(candidates, self.unindexed)
+
+        hits = np.zeros(len(self.uniques) + 1, dtype=bool)
+        hits[candidates] = [isinstance(v, str) and pattern.search(v) is not None for v in self.uniques[candidates]]
+        # pd.factorize gives missing values a code of -1, which selects the extra False at the end
+        return pd.Series(hits[self.codes], index=self.index, name=self.name)
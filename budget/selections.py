@@ -0,0 +1,153 @@
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+
+class SelectionMatrix:
+    """Compact stand-in for the :class:`bool` :class:`~pandas.DataFrame` of category selections
+
+    Categories are hierarchical, so the number of distinct rows in the selections is tiny compared to the number of
+    transactions. Each distinct row (a `pattern`) is stored once, and each transaction only stores the `code` of its
+    pattern. Columns are built on demand, so ``sel[category]`` works the same way it does for a
+    :class:`~pandas.DataFrame`
+
+    Attributes
+    ----------
+    codes : :class:`~numpy.ndarray`
+        :class:`int` code of the pattern for each transaction
+    patterns : :class:`~numpy.ndarray`
+        2D :class:`bool` array with one row per pattern and one column per category
+    columns : :class:`~pandas.Index`
+        category names
+    index : :class:`~pandas.Index`
+        index of the transactions, usually a :class:`~pandas.DatetimeIndex`
+    """
+
+    def __init__(self, codes: np.ndarray, patterns: np.ndarray, columns: List[str], index: pd.Index):
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.patterns = np.asarray(patterns, dtype=bool)
+        self.columns = pd.Index(columns)
+        self.index = index
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'SelectionMatrix':
+        """Converts a :class:`bool` :class:`~pandas.DataFrame` by finding its distinct rows
+        """
+        values = df.to_numpy(dtype=bool)
+        if values.shape[0] == 0 or values.shape[1] == 0:
+            return cls(np.zeros(values.shape[0]), np.zeros((1, values.shape[1])), df.columns, df.index)
+
+        # packing the bits lets each row be compared as a single value
+        packed = np.ascontiguousarray(np.packbits(values, axis=1))
+        rows = packed.view(np.dtype((np.void, packed.shape[1]))).reshape(-1)
+        uniques, first, codes = np.unique(rows, return_index=True, return_inverse=True)
+        return cls(codes.reshape(-1), values[first], df.columns, df.index)
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __repr__(self) -> str:
+        return f'<SelectionMatrix: {len(self)} transactions, {self.columns.shape[0]} categories, ' \
+               f'{self.patterns.shape[0]} patterns>'
+
+    def __getitem__(self, key) -> Union[pd.Series, 'SelectionMatrix']:
+        """Selects a single category column with a :class:`str`, otherwise selects rows with a boolean mask, slice or
+        positions
+        """
+        if isinstance(key, str):
+            return pd.Series(self.patterns[:, self.columns.get_loc(key)][self.codes], index=self.index, name=key)
+        else:
+            return self.take(np.arange(len(self))[np.asarray(key) if not isinstance(key, slice) else key])
+
+    @property
+    def shape(self):
+        return len(self), self.columns.shape[0]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.patterns[self.codes]
+
+    def any(self, axis: int = 1) -> pd.Series:
+        if axis not in (1, 'columns'):
+            raise ValueError('SelectionMatrix.any() only works across the columns')
+        return pd.Series(self.patterns.any(axis=1)[self.codes], index=self.index)
+
+    def sum(self) -> pd.Series:
+        """Number of transactions selected by each category
+        """
+        counts = np.bincount(self.codes, minlength=self.patterns.shape[0])
+        return pd.Series(counts @ self.patterns.astype(int), index=self.columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns)
+
+    def code_frame(self) -> pd.DataFrame:
+        """Pattern code of each transaction, in the form that's saved to SQL
+        """
+        return pd.DataFrame({'code': self.codes}, index=self.index)
+
+    def pattern_frame(self) -> pd.DataFrame:
+        """Categories included in each pattern, in the form that's saved to SQL
+        """
+        return pd.DataFrame(self.patterns, columns=self.columns).rename_axis('code')
+
+    def copy(self) -> 'SelectionMatrix':
+        return SelectionMatrix(self.codes.copy(), self.patterns.copy(), self.columns.copy(), self.index.copy())
+
+    def equals(self, other) -> bool:
+        if isinstance(other, SelectionMatrix):
+            return (
+                self.columns.equals(other.columns) and
+                self.index.equals(other.index) and
+                np.array_equal(self.values, other.values)
+            )
+        elif isinstance(other, pd.DataFrame):
+            return self.to_frame().equals(other)
+        return False
+
+    def take(self, indices) -> 'SelectionMatrix':
+        """Selects rows by position, keeping the same patterns
+        """
+        return SelectionMatrix(self.codes[indices], self.patterns, self.columns, self.index[indices])
+
+    def merge_patterns(self, patterns: np.ndarray) -> 'SelectionMatrix':
+        """Makes an equivalent :class:`SelectionMatrix` whose patterns start with the given ones, in the same order.
+        Patterns of this matrix that aren't already in `patterns` are added after them
+
+        Parameters
+        ----------
+        patterns : :class:`~numpy.ndarray`
+            2D :class:`bool` array with the same number of columns
+
+        Returns
+        -------
+        :class:`SelectionMatrix`
+        """
+        patterns = np.asarray(patterns, dtype=bool)
+        lookup = {row.tobytes(): i for i, row in reversed(list(enumerate(patterns)))}
+        added = []
+        mapping = np.empty(self.patterns.shape[0], dtype=np.int32)
+        for i, row in enumerate(self.patterns):
+            key = row.tobytes()
+            if key not in lookup:
+                lookup[key] = patterns.shape[0] + len(added)
+                added.append(row)
+            mapping[i] = lookup[key]
+
+        if added:
+            patterns = np.vstack([patterns, added])
+        return SelectionMatrix(mapping[self.codes], patterns, self.columns, self.index)
+
+    def append(self, other: 'SelectionMatrix') -> 'SelectionMatrix':
+        """Adds the rows of another :class:`SelectionMatrix` with the same columns after the rows of this one
+        """
+        if not self.columns.equals(other.columns):
+            raise ValueError('SelectionMatrix columns need to match to append them')
+        other = other.merge_patterns(self.patterns)
+        return SelectionMatrix(
+            np.concatenate([self.codes, other.codes]),
+            other.patterns,
+            self.columns,
+            self.index.append(other.index)
+        )
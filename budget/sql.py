@@ -0,0 +1,338 @@
+import atexit
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# write-ahead logging lets reads carry on during a save, and with it NORMAL sync is still safe from corruption.
+# negative cache sizes are in KiB
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64_000,
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY'
+}
+_CONNECTIONS = {}
+
+
+def connect(path, pragmas: Dict = None) -> sqlite3.Connection:
+    """Opens a connection to a SQLite database with a performance profile applied, or reuses the connection that's
+    already open to the same file from the same thread
+
+    Parameters
+    ----------
+    path : str or :class:`~pathlib.Path`
+        path of the database file
+    pragmas : dict
+        ``PRAGMA`` settings for new connections, :data:`PRAGMAS` by default
+
+    Returns
+    -------
+    :mod:`sqlite3` connection
+    """
+    path = Path(path).resolve()
+    key = (str(path), threading.get_ident())
+    if key in _CONNECTIONS:
+        con, inode = _CONNECTIONS[key]
+        try:
+            if path.stat().st_ino == inode:
+                return con
+        except FileNotFoundError:
+            pass
+        # the file was deleted or replaced since the connection was opened
+        close_connection(key)
+
+    con = sqlite3.connect(path)
+    for name, value in (PRAGMAS if pragmas is None else pragmas).items():
+        con.execute(f'pragma {name} = {value}')
+    _CONNECTIONS[key] = (con, path.stat().st_ino)
+    LOGGER.debug(f'Opened SQL connection to\n{path}')
+    return con
+
+
+def close_connection(key: Tuple[str, int]):
+    con, inode = _CONNECTIONS.pop(key)
+    con.close()
+
+
+@atexit.register
+def close_connections():
+    """Closes all the pooled connections, which also checkpoints and removes the write-ahead logs
+    """
+    for key in list(_CONNECTIONS):
+        close_connection(key)
+
+
+def fingerprints(frame: pd.DataFrame, key: str) -> pd.Series:
+    """Hashes each row of a :class:`~pandas.DataFrame`, so that the rows that changed since it was last saved can be
+    found without keeping a copy of it
+
+    Parameters
+    ----------
+    frame : :class:`~pandas.DataFrame`
+        rows in the form they're saved to SQL
+    key : str
+        column with the unique key of each row
+
+    Returns
+    -------
+    :class:`~pandas.Series`
+        :class:`~numpy.uint64` hash of each row, indexed by its key
+    """
+    if frame.shape[0] > 0:
+        # most values are distinct, so hashing them directly is faster than factorizing them first
+        values = pd.util.hash_pandas_object(frame, index=False, categorize=False).values
+    else:
+        values = np.array([], dtype=np.uint64)
+    return pd.Series(values, index=pd.Index(frame[key].values, name=key), dtype=np.uint64)
+
+
+def changed_keys(saved: pd.Series, current: pd.Series) -> Tuple[pd.Index, pd.Index]:
+    """Compares the :func:`fingerprints` of the rows that were saved with the ones that are there now
+
+    Returns
+    -------
+    tuple
+        keys of the rows that are new or different, which need to be upserted, and keys of the rows that need to be
+        deleted
+    """
+    if saved.index.equals(current.index):
+        # rows usually stay in the same order, which doesn't need any lookups
+        return current.index[saved.values != current.values], current.index[:0]
+
+    pos = saved.index.get_indexer(current.index)
+    found = pos >= 0
+    same = np.zeros(current.shape[0], dtype=bool)
+    same[found] = saved.values[pos[found]] == current.values[found]
+    return current.index[~same], saved.index[~saved.index.isin(current.index)]
+
+
+def key_column(con, name: str) -> Optional[str]:
+    """Name of the primary key column of a table, ``None`` if the table doesn't exist or doesn't have a single column
+    as its primary key
+    """
+    keys = [row[1] for row in con.execute(f'pragma table_info("{name}")') if row[5] > 0]
+    if len(keys) == 1:
+        return keys[0]
+
+
+def table_columns(con, name: str) -> List[str]:
+    return [row[1] for row in con.execute(f'pragma table_info("{name}")')]
+
+
+def sql_records(frame: pd.DataFrame) -> List[tuple]:
+    """Converts rows to tuples of values that :mod:`sqlite3` can write, the same way
+    :meth:`~pandas.DataFrame.to_sql` stores them. Missing values become ``NULL``
+    """
+    columns = []
+    for name, col in frame.items():
+        if pd.api.types.is_datetime64_dtype(col):
+            # same text as datetime.isoformat(' '), which is what sqlite3 stores for datetime objects
+            values = col.values.astype('datetime64[us]')
+            missing = np.isnat(values)
+            unit = 's' if (values[~missing].view(np.int64) % 1_000_000 == 0).all() else 'us'
+            text = np.datetime_as_string(values, unit=unit)
+            if text.shape[0] > 0:
+                # swaps the T between the date and the time for a space, straight in the unicode code points
+                text.view(np.uint32).reshape(text.shape[0], -1)[:, 10] = ord(' ')
+            text = text.astype(object)
+            text[missing] = None
+            columns.append(text.tolist())
+        else:
+            col = col.astype(object)
+            columns.append(col.where(col.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+def date_filter(column: str, start: pd.Timestamp = None, end: pd.Timestamp = None) -> Tuple[str, List[str]]:
+    """Makes a ``where`` clause that keeps the rows with dates from `start` up to, but not including, `end`. Dates are
+    stored as text that sorts in date order, so the bounds are compared as text too
+
+    Returns
+    -------
+    tuple
+        the clause, which is empty when there are no bounds, and its parameters
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(f'"{column}" >= ?')
+        params.append(pd.Timestamp(start).isoformat(' '))
+    if end is not None:
+        conditions.append(f'"{column}" < ?')
+        params.append(pd.Timestamp(end).isoformat(' '))
+    return (f' where {" and ".join(conditions)}' if conditions else ''), params
+
+
+def temp_ids(con, ids, name: str = 'query_ids') -> str:
+    """Fills a temporary table with ids for queries to join against, which avoids the limit on the number of
+    parameters in a query
+
+    Returns
+    -------
+    str
+        ``select`` of the ids, for use in a subquery
+    """
+    con.execute(f'create temp table if not exists "{name}" (id text primary key)')
+    con.execute(f'delete from temp."{name}"')
+    con.executemany(f'insert or ignore into temp."{name}" values (?)', ((v,) for v in np.asarray(ids).tolist()))
+    return f'select id from temp."{name}"'
+
+
+def track_changes(con, name: str, log: str, column: str = None,
+                  events: Iterable[str] = ('insert', 'update', 'delete')) -> bool:
+    """Makes triggers that record the changes to a table in a log table, which is created if it's missing. Each
+    change adds the value of `column` from the rows before and after it, or a ``NULL`` when there's no column
+
+    Parameters
+    ----------
+    con : :mod:`sqlite3` connection
+    name : str
+        name of the table to track
+    log : str
+        name of the log table, which has a single ``value`` column
+    column : str
+        column to record
+    events : iterable of str
+        kinds of changes to record
+
+    Returns
+    -------
+    bool
+        whether the triggers were all there already. Dropping a table also drops its triggers, so changes could have
+        been missed otherwise
+    """
+    con.execute(f'create table if not exists "{log}" (value)')
+    existing = {
+        row[0] for row in
+        con.execute("select name from sqlite_master where type = 'trigger' and tbl_name = ?", (name,))
+    }
+    rows = {'insert': ['new'], 'update': ['old', 'new'], 'delete': ['old']}
+    complete = True
+    for event in events:
+        trigger = f'tr_{name}_{event}_{log}'
+        if trigger not in existing:
+            complete = False
+            values = [f'{row}."{column}"' if column else 'null' for row in rows[event]]
+            inserts = ' '.join(f'insert into "{log}" values ({value});' for value in values)
+            con.execute(f'create trigger "{trigger}" after {event} on "{name}" begin {inserts} end')
+    return complete
+
+
+
+def fold_log(con, log: str, group: str = 'value'):
+    """Drops the rows of a log table made by :func:`track_changes` that repeat an earlier value, so that the log only
+    grows with the number of distinct values rather than the number of changes
+
+    Parameters
+    ----------
+    con : :mod:`sqlite3` connection
+    log : str
+        name of the log table
+    group : str
+        SQL expression of the ``value`` column that decides which rows count as repeats
+    """
+    con.execute(f'delete from "{log}" where rowid not in (select min(rowid) from "{log}" group by {group})')
+
+
+def create_table(con, name: str, frame: pd.DataFrame, key: Union[str, List[str]] = None,
+                 indexes: Iterable[str] = ()):
+    """Replaces a table with the rows of a :class:`~pandas.DataFrame`. The column types come from the dtypes of the
+    columns, so they should be set even when `frame` is empty
+
+    Parameters
+    ----------
+    con : :mod:`sqlite3` connection
+    name : str
+        name of the table
+    frame : :class:`~pandas.DataFrame`
+        rows to write, with any index already reset into the columns
+    key : str or list of str
+        column or columns to use as the primary key
+    indexes : iterable of str
+        other columns to index
+    """
+    con.execute(f'drop table if exists "{name}"')
+    con.execute(pd.io.sql.get_schema(frame, name, keys=key, con=con))
+    insert_rows(con, name, frame)
+    # building the indexes after the rows are in is faster than updating them row by row
+    create_indexes(con, name, indexes)
+    LOGGER.debug(f'Wrote all {frame.shape[0]} rows of {name}')
+
+
+def create_indexes(con, name: str, columns: Iterable[str]):
+    for col in columns:
+        con.execute(f'create index if not exists "ix_{name}_{col}" on "{name}" ("{col}")')
+
+
+def insert_rows(con, name: str, frame: pd.DataFrame):
+    cols = ', '.join(f'"{col}"' for col in frame.columns)
+    params = ', '.join('?' * frame.shape[1])
+    con.executemany(f'insert into "{name}" ({cols}) values ({params})', sql_records(frame))
+
+
+def upsert_rows(con, name: str, frame: pd.DataFrame, key: str):
+    """Inserts rows, updating the existing rows that have the same `key` instead
+    """
+    cols = ', '.join(f'"{col}"' for col in frame.columns)
+    params = ', '.join('?' * frame.shape[1])
+    updates = ', '.join(f'"{col}" = excluded."{col}"' for col in frame.columns if col != key)
+    con.executemany(
+        f'insert into "{name}" ({cols}) values ({params}) on conflict ("{key}") do update set {updates}',
+        sql_records(frame)
+    )
+
+
+def delete_rows(con, name: str, column: str, values):
+    con.executemany(f'delete from "{name}" where "{column}" = ?', ((v,) for v in np.asarray(values).tolist()))
+
+
+def write_table(con, name: str, frame: pd.DataFrame, key: str, saved: pd.Series = None,
+                indexes: Iterable[str] = ()) -> pd.Series:
+    """Saves a :class:`~pandas.DataFrame` to a table with `key` as its primary key, only writing the rows that changed
+    since the table was last saved. The whole table is written again if there's nothing to compare against or if the
+    table doesn't have the same columns and primary key. Raises a :class:`ValueError` if any of the keys are repeated
+
+    Parameters
+    ----------
+    con : :mod:`sqlite3` connection
+    name : str
+        name of the table
+    frame : :class:`~pandas.DataFrame`
+        rows to save, with any index already reset into the columns
+    key : str
+        column with the unique key of each row
+    saved : :class:`~pandas.Series`
+        :func:`fingerprints` of the rows as they were last saved to or loaded from this table
+    indexes : iterable of str
+        other columns to index, which are created if they're missing
+
+    Returns
+    -------
+    :class:`~pandas.Series`
+        :func:`fingerprints` of the rows that are now in the table
+    """
+    current = fingerprints(frame, key)
+    # keys that are the same as the saved ones are already known to be unique
+    if (saved is None or not saved.index.equals(current.index)) and not current.index.is_unique:
+        repeated = current.index[current.index.duplicated()].unique()
+        raise ValueError(
+            f'Can\'t save {name}, {repeated.shape[0]} values of its {key} column are repeated but they need to be '
+            f'unique: {repeated[:5].tolist()}'
+        )
+    if saved is None or key_column(con, name) != key or table_columns(con, name) != frame.columns.tolist():
+        create_table(con, name, frame, key, indexes)
+        return current
+
+    create_indexes(con, name, indexes)
+    upserts, deletes = changed_keys(saved, current)
+    delete_rows(con, name, key, deletes)
+    upsert_rows(con, name, frame[current.index.isin(upserts)], key)
+    LOGGER.debug(f'Upserted {upserts.shape[0]} and deleted {deletes.shape[0]} rows of {name}')
+    return current
@@ -1,6 +1,7 @@
-from datetime import timedelta
-from typing import Union, List, Dict, Callable
+from datetime import date, timedelta
+from typing import Union, List, Dict, Callable, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 
@@ -81,7 +82,6 @@ def recursive_items(nested_dicts: Dict[object, Dict]):
     for key, value in nested_dicts.items():
         yield (key, value)
         if isinstance(value, dict):
-            yield (key, value)
             yield from recursive_items(value)
         elif isinstance(value, list) and any([isinstance(item, dict) for item in value]):
             for item in value:
@@ -119,3 +119,51 @@ def apply_func(obj: Union[List, Dict], func: Callable):
         return [comp_helper(item) for item in obj]
     else:
         return func(obj)
+
+
+def row_positions(ids: pd.Series, values) -> np.ndarray:
+    """Finds the position of the first row with each value in a column of transaction ids
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        :class:`int` position for each value, ``-1`` if it's not in the ids
+    """
+    first = ~ids.duplicated().values
+    rows = np.append(np.flatnonzero(first), -1)
+    return rows[pd.Index(ids.values[first]).get_indexer(pd.Index(values, dtype='object'))]
+
+
+def date_bounds(key) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """Finds the dates covered by a key for slicing transactions by date, like ``'2020'`` or ``slice('2019', '2020')``.
+    Partial date strings cover their whole period, the same way they do when slicing a
+    :class:`~pandas.DatetimeIndex`
+
+    Returns
+    -------
+    tuple or ``None``
+        start :class:`~pandas.Timestamp` and the end :class:`~pandas.Timestamp` that isn't included, either of which is
+        ``None`` for an open end. ``None`` if the key isn't a date or a slice of dates
+    """
+    if isinstance(key, slice):
+        start, stop = key.start, key.stop
+    elif isinstance(key, str):
+        start, stop = key, key
+    else:
+        return
+    if not all(v is None or isinstance(v, (str, date, np.datetime64)) for v in (start, stop)):
+        return
+
+    try:
+        if isinstance(start, str):
+            start = pd.Period(start).start_time
+        elif start is not None:
+            start = pd.Timestamp(start)
+        if isinstance(stop, str):
+            stop = (pd.Period(stop) + 1).start_time
+        elif stop is not None:
+            # dates are stored to the microsecond
+            stop = pd.Timestamp(stop) + pd.Timedelta(1, 'us')
+    except (ValueError, TypeError):
+        return
+    return start, stop
@@ -101,16 +101,19 @@ class CatInspector(widgets.VBox):
 
     def show_report(self, *args):
         if self.note_button:
-            df = self.bd[self.selected_cat]
+            # totals come from the rollup cube, and the transactions are only rendered once some are selected
+            self.groups = None
+            self.report.df = self.bd.report(self.selected_cat, freq=self.freq).set_axis(['Amount'], axis=1)
         else:
-            df = self.bd.df[self.bd._sel[self.selected_cat]]
-        grouped = df.groupby(pd.Grouper(freq=self.freq))
-        self.groups = {date: df for date, df in grouped}
-        self.report.df = grouped.sum().sort_index(ascending=False)
+            grouped = self.bd.df[self.bd._sel[self.selected_cat]].groupby(pd.Grouper(freq=self.freq))
+            self.groups = {date: df for date, df in grouped}
+            self.report.df = grouped.sum().sort_index(ascending=False)
         self.report.change_selection()
 
     def show_transactions(self, *args):
         idx = self.report.get_selected_df().index
+        if self.groups is None:
+            self.groups = {date: df for date, df in self.bd[self.selected_cat].groupby(pd.Grouper(freq=self.freq))}
         try:
             res = pd.concat([self.groups[i] for i in idx]).sort_index()
         except ValueError:
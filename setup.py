@@ -14,5 +14,8 @@ setup(
         'qgrid',
         'pyperclip',
     ],
+    extras_require={
+        'cache': ['pyarrow'],
+    },
     packages=find_packages()
 )
\ No newline at end of file
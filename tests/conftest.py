@@ -0,0 +1,15 @@
+import pytest
+
+import gen
+
+
+@pytest.fixture(autouse=True)
+def config(request, tmp_path):
+    """Writes a yaml config to a temporary folder, see :func:`gen.write_config`. Test cases get it as ``self.yaml_path``
+    and the folder as ``self.tmp_path``, so anything they save ends up in the folder
+    """
+    path = gen.write_config(tmp_path)
+    if request.instance is not None:
+        request.instance.yaml_path = path
+        request.instance.tmp_path = tmp_path
+    return path
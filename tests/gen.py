@@ -1,13 +1,36 @@
 from datetime import datetime
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import yaml
 
 from budget import BudgetData
 
+# matches the same transactions as the selections that gen_bd makes
+CATEGORIES = {'A': '#0', 'B': '#2', 'C': '#9'}
 
-def gen_bd():
-    bd = BudgetData('test')
+
+def write_config(folder: Path) -> Path:
+    """Writes a yaml config with a CSV statement of the same transactions as gen_bd, and a database next to it
+    """
+    statements = folder / 'statements'
+    (statements / 'Checking').mkdir(parents=True)
+    df = gen_bd(folder / 'missing.yaml')._df
+    df = df.reset_index()[['Date', 'Amount', 'Description']]
+    df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
+    df.to_csv(statements / 'Checking' / 'checking.csv', index=False)
+
+    path = folder / 'test.yaml'
+    path.write_text(yaml.safe_dump({
+        'Loading': {'db': 'test.db', 'base': str(statements), 'Accounts': {'Checking': {'loader': 'load_chase'}}},
+        'Categories': CATEGORIES
+    }))
+    return path
+
+
+def gen_bd(yaml_path='test'):
+    bd = BudgetData(yaml_path)
     bd._df = pd.DataFrame(
         data={
             'Description': [f'Transaction #{i}' for i in range(4)],
@@ -1,4 +1,6 @@
 import logging
+import os
+import tempfile
 import unittest
 from pathlib import Path
 from unittest import TestCase
@@ -6,18 +8,34 @@ from unittest import TestCase
 import pandas as pd
 
 import gen
+from budget.load import hash, hash_df, load_config
 
 logging.basicConfig(level=logging.DEBUG)
 
 
 class LoaderTest(TestCase):
     def setUp(self) -> None:
-        self.bd = gen.gen_bd()
+        self.bd = gen.gen_bd(self.yaml_path)
         self.bd.yaml_path = Path(r'..\examples\user_config.yaml')
 
     def test_loader(self):
         self.bd.load_csv()
         self.assertIsInstance(self.bd._df, pd.DataFrame)
 
+    def test_hash_df(self):
+        df = self.bd._df[['Amount', 'Description']]
+        self.assertTrue((hash_df(df).values == df.apply(hash, axis=1).values).all())
+
+    def test_load_config(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / 'config.yaml'
+            path.write_text('Categories:\n  Food: pizza\n')
+            cfg = load_config(path)
+            self.assertIs(load_config(path), cfg)
+
+            path.write_text('Categories:\n  Food: tacos\n')
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(load_config(path)['Categories']['Food'], 'tacos')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
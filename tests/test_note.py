@@ -1,15 +1,17 @@
+import sqlite3
 import unittest
-from pathlib import Path
 from unittest import TestCase
 
 import gen
+import pandas as pd
 
 import budget
+from budget.notes import NoteManager
 
 
 class NoteTestCase(TestCase):
     def setUp(self) -> None:
-        self.bd: budget.BudgetData = gen.gen_bd()
+        self.bd: budget.BudgetData = gen.gen_bd(self.yaml_path)
 
     def test_link_notes(self):
         self.bd.add_note(self.bd.df.iloc[-1], f'link: {self.bd.id[0]}')
@@ -18,6 +20,14 @@ class NoteTestCase(TestCase):
         self.assertEqual(self.bd['B'].iloc[0]['Amount'], 0.0, 'Link note failed')
         self.assertEqual(self.bd[-1].iloc[0]['Amount'], 0.0, 'Link note failed')
 
+    def test_link_chain(self):
+        self.bd.add_note(self.bd.df.iloc[0], f'link: {self.bd.id[1]}')
+        self.bd.add_note(self.bd.df.iloc[1], f'link: {self.bd.id[2]}')
+        nm = self.bd.note_manager
+        self.assertEqual(sorted(nm.linked_ids(self.bd._df.iloc[2:3])), sorted(self.bd.id[:2]))
+        df = nm.apply_linked(self.bd._df)
+        self.assertEqual(df['Amount'].tolist(), [0.0, 0.0, 436.5, -200.0])
+
     def test_split(self):
         self.bd.add_note(self.bd.df.iloc[0], 'split: 50% B, 10% C')
         self.bd.add_note(self.bd.df.iloc[1], 'split: $10 C')
@@ -34,6 +44,23 @@ class NoteTestCase(TestCase):
         n = self.bd.note_manager.get_notes_by_id([self.bd.id[0]])[0]
         self.assertIsInstance(n, budget.notes.Note)
 
+    def test_note_table(self):
+        nm = self.bd.note_manager
+        self.bd.add_note(self.bd.df.iloc[0], 'cat: B')
+        self.bd.add_note(self.bd.df.iloc[1], 'split: 50% B, 1/4 C')
+        self.bd.add_note(self.bd.df.iloc[2], f'link: {self.bd.id[3]}')
+        self.bd.add_note(self.bd.df.iloc[2], f'link: {self.bd.id[3]}')
+        self.assertEqual(nm.table.shape[0], 3)
+        self.assertEqual(nm.manual_ids('B').tolist(), [self.bd.id[0]])
+        self.assertEqual(nm.split_ids('C').tolist(), [self.bd.id[1]])
+        self.assertEqual(nm.splits['value'].tolist(), [0.5, 0.25])
+        self.assertEqual(nm.linked_ids(self.bd._df.iloc[3:]).tolist(), [self.bd.id[2]])
+        self.assertIsInstance(nm.get_notes_by_type(budget.notes.Link).iloc[0], budget.notes.Link)
+
+        nm.drop(self.bd.id[1], 'split: 50% B, 1/4 C')
+        self.assertEqual(nm.splits.shape[0], 0)
+        self.assertEqual(nm.notes.index.tolist(), [self.bd.id[0], self.bd.id[2]])
+
     def test_save_load_sql(self):
         self.bd.add_note(self.bd.df.iloc[0], 'asdf')
         self.bd.add_note(self.bd.df.iloc[0], 'music: asdf')
@@ -46,7 +73,7 @@ class NoteTestCase(TestCase):
         original_sel = self.bd._sel.copy()
         original_notes = self.bd._notes.copy()
 
-        path = Path('test.db')
+        path = self.tmp_path / 'test.db'
         self.bd.save_sql(path)
         self.bd.load_sql(path)
 
@@ -54,13 +81,59 @@ class NoteTestCase(TestCase):
         self.assertTrue(original_sel.equals(self.bd._sel))
         self.assertTrue(original_notes.equals(self.bd._notes))
 
+    def test_add_notes(self):
+        nm = self.bd.note_manager
+        nm.add_notes(self.bd.id[:3], 'split: 50% B, $5 C')
+        nm.add_notes(self.bd.id, 'split: 50% B, $5 C')
+        self.assertEqual(nm.table.shape[0], 4)
+        self.assertEqual(nm.splits.shape[0], 8)
+        self.assertEqual(nm.split_ids('C').tolist(), self.bd.id.tolist())
+        self.assertIsInstance(nm.notes.iloc[-1], budget.notes.SplitNote)
+
+        # the df view doesn't have ids, and hashing it mustn't add them to the cached view
+        self.bd.add_note(self.bd.df, 'gift: asdf')
+        self.assertNotIn('id', self.bd.df.columns)
+        self.assertEqual(nm.contains('gift').index.tolist(), self.bd.id.tolist())
+
+    def test_note_search(self):
+        nm = self.bd.note_manager
+        nm.add_notes(self.bd.id[:2], 'trip: Snowboarding')
+        nm.add_notes(self.bd.id[1:], 'gift: board game')
+        for query in ['board', 'SNOW', 'trip: snow', 'gift|trip', r'\w+: b', 'g']:
+            expected = nm.table['note'].str.contains(query, case=False).values
+            self.assertEqual(nm.search_mask(query).tolist(), expected.tolist(), query)
+
+        nm.drop(self.bd.id[0], 'trip: Snowboarding')
+        self.assertEqual(nm.contains('snowboarding').index.tolist(), [self.bd.id[1]])
+        self.assertEqual(nm.contains('Board', case=True).shape[0], 0)
+
+    def test_legacy_notes(self):
+        self.bd.add_note(self.bd.df.iloc[0], 'split: 25%, 50% BA')
+        self.bd.add_note(self.bd.df.iloc[1], f'link: {self.bd.id[-1]}')
+        original_notes = self.bd._notes.copy()
+
+        path = self.tmp_path / 'test_legacy.db'
+        with sqlite3.connect(path) as con:
+            # notes used to be saved as the repr of each Note
+            original_notes.map(repr).to_sql(name=NoteManager.SQL_NOTE_TABLE, con=con, if_exists='replace')
+            nm = NoteManager()
+            nm.load_notes(con)
+            self.assertTrue(original_notes.equals(nm.notes))
+            self.assertEqual(nm.split_ids('BA').tolist(), [self.bd.id[0]])
+            self.assertIn('kind', pd.read_sql_query(f'select * from {nm.SQL_NOTE_TABLE}', con).columns)
+
     def test_note_df(self):
         self.bd.add_note(self.bd.df.iloc[-1], f'link: {self.bd.id[0]}')
         self.bd.add_note(self.bd.df.iloc[-2], f'link: {self.bd.id[0]}')
         self.bd.add_note(self.bd.df.iloc[-1], f'custom note')
+        # the 3 notes, along with the transaction that both links lead to
         df = self.bd.note_df(self.bd._df)
-        self.assertEqual(3, df.shape[0])
+        self.assertEqual(4, df.shape[0])
+        self.assertEqual(df['Note'].isna().sum(), 1)
+        # links into a transaction bring in the notes of the transactions they come from
         df = self.bd.note_df(self.bd._df.iloc[:1])
+        self.assertEqual(4, df.shape[0])
+        df = self.bd.note_df(self.bd._df.iloc[1:2])
         self.assertEqual(0, df.shape[0])
 
 if __name__ == '__main__':
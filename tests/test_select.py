@@ -3,10 +3,13 @@ import unittest
 import gen
 import pandas as pd
 
+from budget.processing import gen_mask_tree, match_queries
+from budget.selections import SelectionMatrix
+
 
 class SelectTest(unittest.TestCase):
     def setUp(self) -> None:
-        self.bd = gen.gen_bd()
+        self.bd = gen.gen_bd(self.yaml_path)
 
     def test_mask_select(self):
         sel = pd.Series([True, False, True, False], index=self.bd.df.index)
@@ -20,9 +23,57 @@ class SelectTest(unittest.TestCase):
         self.assertEqual(self.bd[0].iloc[0].name, self.bd._df.iloc[0].name)
         self.assertTrue(self.bd[0:2].index.equals(self.bd._df.iloc[0:2].index))
 
+    def test_id_select(self):
+        ids = [self.bd.id[2], 'missing', self.bd.id[0]]
+        df = self.bd.df_from_ids(ids)
+        self.assertEqual(df['id'].iloc[0], ids[0])
+        self.assertTrue(pd.isna(df['id'].iloc[1]))
+        self.assertEqual(df['Amount'].iloc[2], self.bd._df['Amount'].iloc[0])
+
+        self.bd._df = self.bd._df.iloc[1:]
+        self.assertEqual(self.bd.id_positions(ids).tolist(), [1, -1, -1])
+
+    def test_search(self):
+        for query in ['transaction #1', 'ACTION', r'#\d', '#[13]|tion #2', ['trans', '0']]:
+            self.bd.SEARCH_INDEX = True
+            indexed = self.bd.search(query)
+            self.bd.SEARCH_INDEX = False
+            self.assertTrue(indexed.equals(self.bd.search(query)), query)
+        self.assertEqual(self.bd.search('transaction #1').sum(), 1)
+
     def test_date_select(self):
         # TODO remove dependency on what actual year it is
         self.assertTrue(self.bd['2020'].index.equals(self.bd.df['2020'].index))
 
+    def test_first_match(self):
+        cats = {'A': ['#1', '#[12]'], 'B': {'C': [['trans', '3']], 'D': 'action'}}
+        masks = gen_mask_tree(self.bd.df, cats)
+        self.assertEqual(masks['A'][0].tolist(), [False, True, False, False])
+        self.assertEqual(masks['A'][1].tolist(), [False, False, True, False])
+        self.assertEqual(masks['B']['C'][0].tolist(), [False, False, False, True])
+        self.assertEqual(masks['B']['D'].tolist(), [True, False, False, False])
+
+    def test_match_fallback(self):
+        # backreferences can't be combined into a single regex
+        desc = pd.Series(['aa', 'ab', None])
+        self.assertEqual(match_queries(desc, [r'(\w)\1', 'b']).tolist(), [0, 1, -1])
+
+    def test_selection_matrix(self):
+        df = self.bd._sel.to_frame()
+        sel = SelectionMatrix.from_frame(df)
+        self.assertTrue(sel.equals(df))
+        self.assertTrue(sel['B'].equals(df['B']))
+        self.assertTrue(sel.any(axis=1).equals(df.any(axis=1)))
+        self.assertTrue(sel[:2].append(sel[2:]).equals(df))
+
+    def test_report(self):
+        self.bd.add_note(self.bd.df.iloc[1], 'split: 50% A, 1/2 B')
+        res = self.bd.report(['A', 'B', 'A'])
+        self.assertEqual(res.columns.tolist(), ['A', 'B', 'A'])
+        for i, cat in enumerate(['A', 'B']):
+            df = self.bd[cat]
+            expected = df.groupby(df.index)['Amount'].sum().reindex(res.index, fill_value=0)
+            self.assertTrue(res.iloc[:, i].sort_index().equals(expected.sort_index().rename(cat)), cat)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
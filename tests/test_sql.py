@@ -1,22 +1,223 @@
+import sqlite3
 import unittest
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import gen
+import pandas as pd
+from budget import BudgetData
+from budget.sql import connect, key_column
+from budget.utils import date_bounds
 
 
 class SQLTestCase(TestCase):
     def setUp(self) -> None:
-        self.bd = gen.gen_bd()
+        self.bd = gen.gen_bd(self.yaml_path)
 
     def test_sql(self):
         attrs = ['_df', '_sel', 'notes']
         attrs = {key: getattr(self.bd, key).copy() for key in attrs}
 
-        self.bd.save_sql('test.db')
-        self.bd.load_sql('test.db')
+        path = self.tmp_path / 'test_sql.db'
+        self.bd.save_sql(path)
+        self.bd.load_sql(path)
 
         for key, value in attrs.items():
             self.assertTrue(value.equals(getattr(self.bd, key)))
 
+    def test_incremental_sql(self):
+        path = self.tmp_path / 'test_inc.db'
+        self.bd.add_note(self.bd.df.iloc[0], 'split: 50% B')
+        self.bd.save_sql(path)
+        self.bd.load_sql(path)
+
+        df = self.bd._df
+        df.loc[df.index[1], 'Amount'] = 1.0
+        self.bd._df = df.iloc[1:]
+        self.bd._sel = self.bd._sel[1:]
+        self.bd.note_manager.add_notes(self.bd.id[-2:], 'gift: asdf')
+        attrs = {key: getattr(self.bd, key).copy() for key in ['_df', '_sel', 'notes']}
+        self.bd.save_sql(path)
+
+        with sqlite3.connect(path) as con:
+            self.assertEqual(key_column(con, self.bd.SQL_DF_TABLE), 'id')
+            self.assertEqual(key_column(con, self.bd.note_manager.SQL_NOTE_TABLE), 'key')
+
+        bd = BudgetData(self.bd.yaml_path)
+        bd.COLUMNAR_CACHE = False
+        bd.load_sql(path)
+        for key, value in attrs.items():
+            self.assertTrue(value.equals(getattr(bd, key)), key)
+        self.assertEqual(bd.note_manager.splits.shape[0], 1)
+
+    def test_save_cache(self):
+        path = self.tmp_path / 'test_cache.db'
+        self.bd.save_sql(path)
+
+        # only the notes changed, so the cache is still up to date
+        self.bd.add_note(self.bd.df.iloc[0], 'gift: asdf')
+        with mock.patch.object(BudgetData, 'save_cache') as save_cache:
+            self.bd.save_sql(path)
+        save_cache.assert_not_called()
+        bd = BudgetData(self.bd.yaml_path)
+        self.assertTrue(bd.load_cache(path))
+        self.assertTrue(bd._df.equals(self.bd._df))
+
+        self.bd._df = pd.concat([self.bd._df, self.bd._df.iloc[:1]])
+        self.bd._sel = self.bd._sel.append(self.bd._sel[:1])
+        with self.assertRaises(ValueError):
+            self.bd.save_sql(path)
+
+    def test_date_window(self):
+        path = self.tmp_path / 'test_window.db'
+        df, sel = self.bd._df.copy(), self.bd._sel.copy()
+        self.bd.save_sql(path)
+
+        bd = BudgetData(self.bd.yaml_path)
+        bd.load_sql(path, start=df.index[2].strftime('%Y-%m-%d'))
+        self.assertTrue(bd._df.equals(df.iloc[2:]))
+
+        bd.load_history(*date_bounds(slice(df.index[1].strftime('%Y-%m-%d'), None)))
+        self.assertTrue(bd._df.equals(df.iloc[1:]))
+
+        bd.load_history()
+        self.assertIsNone(bd._window)
+        self.assertTrue(bd._df.equals(df))
+        self.assertTrue(bd._sel.equals(sel))
+
+    def test_window_save(self):
+        path = self.tmp_path / 'test_window.db'
+        df = self.bd._df.copy()
+        self.bd.save_sql(path)
+
+        bd = BudgetData(self.bd.yaml_path)
+        bd.load_sql(path, start=df.index[2].strftime('%Y-%m-%d'))
+        bd._df.loc[bd._df.index[0], 'Amount'] = 1.0
+        bd.clear_df_cache()
+        bd.save_sql(path)
+
+        # the cache can't be written from the window, and the transactions outside of it are still in SQL
+        bd = BudgetData(self.bd.yaml_path)
+        bd.load_sql(path)
+        self.assertIsNone(bd._window)
+        self.assertTrue(bd._df.index.equals(df.index))
+        self.assertEqual(bd._df['Amount'].tolist(), df['Amount'].tolist()[:2] + [1.0] + df['Amount'].tolist()[3:])
+
+    def test_sql_query(self):
+        self.bd.add_note(self.bd.df.iloc[1], 'split: 50% A')
+        self.bd.add_note(self.bd.df.iloc[3], f'link: {self.bd.id[2]}')
+        self.bd.save_sql()
+
+        bd = BudgetData(self.bd.yaml_path)
+        for cat in ['A', 'B']:
+            self.assertTrue(bd[cat]['Amount'].equals(self.bd[cat]['Amount']), cat)
+        pd.testing.assert_frame_equal(bd.report(['A', 'B']), self.bd.report(['A', 'B']), check_names=False,
+                                      check_freq=False)
+        self.assertFalse(hasattr(bd, '_df'))
+
+    def test_sql_report(self):
+        # the split amount and the other transaction on the same day add up to a total that's right on a half cent, so
+        # adding them up in a different order used to round the other way
+        df = self.bd._df
+        df.index = df.index[[0, 0, 2, 3]]
+        df['Amount'] = [30.01, 0.06, 500.0, -200.0]
+        self.bd.hash_transactions()
+        self.bd._sel = pd.DataFrame({'A': [True, True, False, False], 'B': [False, False, True, False]}, index=df.index)
+        self.bd.add_note(self.bd.df.iloc[0], 'split: 50% B')
+        self.bd.save_sql()
+
+        self.bd.ROLLUP = False
+        bd = BudgetData(self.bd.yaml_path)
+        bd.ROLLUP = False
+        pd.testing.assert_frame_equal(bd.report(['A', 'B']), self.bd.report(['A', 'B']), check_names=False)
+
+        # the rollup cube adds up the same whole numbers
+        expected = self.bd.report(['A', 'B'], freq='M')
+        self.bd.ROLLUP = True
+        pd.testing.assert_frame_equal(self.bd.report(['A', 'B'], freq='M'), expected, check_freq=False)
+        bd = BudgetData(self.bd.yaml_path)
+        pd.testing.assert_frame_equal(bd.report(['A', 'B'], freq='M'), expected, check_names=False, check_freq=False)
+
+    def test_rollup(self):
+        self.bd.add_note(self.bd.df.iloc[1], 'split: 50% A')
+        self.bd.save_sql()
+        df = self.bd._df
+        df.loc[df.index[0], 'Amount'] = -40.0
+        self.bd._df = df.iloc[:-1]
+        self.bd._sel = self.bd._sel[:-1]
+        self.bd.add_note(self.bd.df.iloc[2], f'link: {self.bd.id[0]}')
+        self.bd.save_sql()
+
+        self.bd.ROLLUP = False
+        expected = self.bd.report(['A', 'B'], freq='M')
+        bd = BudgetData(self.bd.yaml_path)
+        pd.testing.assert_frame_equal(bd.report(['A', 'B'], freq='M'), expected, check_names=False, check_freq=False)
+        self.bd.ROLLUP = True
+        pd.testing.assert_frame_equal(self.bd.report(['A', 'B'], freq='M'), expected, check_freq=False)
+
+        with connect(self.bd.db_path) as con:
+            self.assertEqual(con.execute(f'select count(*) from {bd.SQL_ROLLUP_LOG_TABLE}').fetchone()[0], 0)
+
+    def test_rollup_log(self):
+        self.bd.add_note(self.bd.df.iloc[1], 'split: 50% A')
+        self.bd.save_sql()
+        self.bd.report_sql(['A', 'B'])
+
+        # saves in between reports keep one entry for each day that changed
+        df = self.bd._df
+        for amount in range(5):
+            df.loc[df.index[1], 'Amount'] = float(amount)
+            self.bd._df = df
+            self.bd.save_sql()
+        with connect(self.bd.db_path) as con:
+            self.assertEqual(con.execute(f'select count(*) from {self.bd.SQL_ROLLUP_LOG_TABLE}').fetchone()[0], 1)
+
+        self.bd.ROLLUP = False
+        expected = self.bd.report(['A', 'B'], freq='M')
+        pd.testing.assert_frame_equal(self.bd.report_sql(['A', 'B'], freq='M'), expected, check_freq=False)
+        self.bd.ROLLUP = True
+        pd.testing.assert_frame_equal(self.bd.report_sql(['A', 'B'], freq='M'), expected, check_freq=False)
+        with connect(self.bd.db_path) as con:
+            self.assertEqual(con.execute(f'select count(*) from {self.bd.SQL_ROLLUP_LOG_TABLE}').fetchone()[0], 0)
+
+    def test_exclude_notes(self):
+        self.bd.add_note(self.bd.df.iloc[1], 'split: 50% A')
+        self.bd.save_sql()
+        bd = BudgetData(self.bd.yaml_path)
+        before = self.bd.report(['A', 'B'], freq='M'), bd.report(['A', 'B'], freq='M')
+
+        # excluding the split changes the totals, even though the notes stay the same
+        with self.yaml_path.open('a') as file:
+            file.write('Exclude Notes:\n- split\n')
+        self.bd.ROLLUP = False
+        expected = self.bd.report(['A', 'B'], freq='M')
+        self.assertFalse(expected.equals(before[0]))
+        self.bd.ROLLUP = True
+        pd.testing.assert_frame_equal(self.bd.report(['A', 'B'], freq='M'), expected, check_freq=False)
+        pd.testing.assert_frame_equal(bd.report(['A', 'B'], freq='M'), expected, check_names=False, check_freq=False)
+
+    def test_update_sql(self):
+        BudgetData(self.yaml_path).update_sql()
+
+        # the category keeps its name but its query matches another transaction now
+        cfg = self.yaml_path.read_text()
+        self.yaml_path.write_text(cfg.replace("B: '#2'", "B: '#[23]'"))
+        BudgetData(self.yaml_path).update_sql()
+
+        bd = BudgetData(self.yaml_path)
+        bd.load_sql()
+        sel = bd._sel.copy()
+        bd.process_categories()
+        self.assertTrue(sel.equals(bd._sel))
+        self.assertEqual(sel['B'].sum(), 2)
+
+    def test_connection(self):
+        path = self.tmp_path / 'test_con.db'
+        self.bd.save_sql(path)
+        con = connect(path)
+        self.assertIs(self.bd.sql_context(path), con)
+        self.assertEqual(con.execute('pragma journal_mode').fetchone()[0], 'wal')
+        indexes = [row[1] for row in con.execute(f'pragma index_list({self.bd.SQL_DF_TABLE})')]
+        self.assertIn(f'ix_{self.bd.SQL_DF_TABLE}_Date', indexes)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file